@@ -0,0 +1,53 @@
+import hashlib, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+
+
+class ViewerCache:
+    """
+    Response cache for the public viewers, keyed by scheme, host, path, query string and language. The responses embed
+    absolute links, like the next page of the results, so the same path requested through another host is another entry.
+    Every namespace keeps a version number in the cache backend. Invalidating a namespace increments the version,
+    so every worker sharing the backend stops serving the old entries at once, and they expire on their own.
+    """
+    def __init__(self, namespace, timeout=None):
+        self.namespace = namespace
+        self.timeout = settings.VIEWER_CACHE_TIMEOUT if timeout is None else timeout
+        self.version_key = f'viewer:{namespace}:version'
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            #A time based version avoids reusing the number of a version key evicted by the backend.
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get_key(self, request):
+        path = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+        return f'viewer:{self.namespace}:{self.get_version()}:{get_language()}:{path}'
+
+    def get(self, request):
+        return cache.get(self.get_key(request))
+
+    def set(self, request, data):
+        cache.set(self.get_key(request), data, self.timeout)
+
+    def invalidate(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, time.time_ns(), None)
+
+
+def invalidate_viewer_cache(*namespaces):
+    """
+    Invalidate the namespaces once the current transaction commits, or immediately outside a transaction.
+    """
+    def invalidate():
+        for namespace in namespaces:
+            ViewerCache(namespace).invalidate()
+    transaction.on_commit(invalidate)
@@ -0,0 +1,174 @@
+import os, posixpath, time, uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+from apps.hotel.models import HotelMedia, RoomMedia, MediaFile, MediaUpload
+from apps.hotel.storage import media_storage
+
+MEDIA_MODELS = (HotelMedia, RoomMedia)
+
+
+def iterate_files(root, directory, skip=()):
+    """
+    Walk the directory with "os.scandir", which returns the type of every entry with the listing, yielding the name of every
+    file relative to the root and its entry, without building the list of files in memory. The directories in "skip" are not walked.
+    """
+    directories = [directory]
+    while directories:
+        current = directories.pop()
+        try:
+            entries = os.scandir(os.path.join(root, current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = posixpath.join(current, entry.name) if current else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in skip:
+                        directories.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry
+
+
+def iterate_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+
+
+class Command(BaseCommand):
+    """
+    Find the files of the "media_hotel/" and "media_room/" directories, and the partial files of the resumable uploads,
+    not used by any record. The deletion of a hotel or a room cascades to its media without calling "delete", and an
+    interrupted "update_model" or processing can store files that no record uses, so those files are never removed otherwise.
+    The directories are walked in batches of files, every batch of images is checked with one query by model, and the
+    names of the variants, which are stored in the JSON of the records, are loaded once in a set before the walk.
+    The files modified in the last "--min-age" seconds are skipped, they may belong to a record not committed yet.
+    The references of the MediaFile records are counted again over both media models first, a count left too high by
+    the media deleted before their references were released would keep its file forever.
+    By default the files and the wrong counts are only reported, with "--delete" the files are removed with their MediaFile
+    records and the counts are corrected.
+    """
+    help = 'Report or remove the hotel and room media files not used by any record.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Remove the files found, by default they are only reported.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--min-age', type=int, default=None, help='Seconds since the last modification of the files collected, MEDIA_ORPHAN_MIN_AGE by default.')
+
+    def repair_references(self, options):
+        """
+        Every batch of MediaFile records is locked while its references are counted, so an acquire or a release of the
+        same files waits for the correction instead of being overwritten by it.
+        """
+        checked = repaired = 0
+        for batch in iterate_queryset_chunks(MediaFile.objects.only('id', 'name'), options['batch_size']):
+            with transaction.atomic():
+                media_files = list(MediaFile.objects.select_for_update().filter(pk__in=[media_file.pk for media_file in batch]))
+                references = MediaFile.count_references(self, names=[media_file.name for media_file in media_files])
+                for media_file in media_files:
+                    if media_file.references == references[media_file.name]:
+                        continue
+                    repaired += 1
+                    if options['verbosity'] > 1 or not options['delete']:
+                        self.stdout.write(f'{media_file.name}: {media_file.references} references counted, {references[media_file.name]} records.')
+                    if options['delete']:
+                        MediaFile.objects.filter(pk=media_file.pk).update(references=references[media_file.name])
+            checked += len(batch)
+        action = 'corrected' if options['delete'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'References: {checked} files checked, {repaired} wrong counts {action}.'))
+
+    def get_variant_names(self, batch_size):
+        names = set()
+        for model in MEDIA_MODELS:
+            for batch in iterate_queryset_chunks(model.objects.only('id', 'variants'), batch_size):
+                names.update(name for model_object in batch for formats in (model_object.variants or {}).values() for name in formats.values())
+        return names
+
+    def get_orphan_images(self, batch):
+        names = [name for name, entry in batch]
+        referenced = set()
+        for model in MEDIA_MODELS:
+            referenced.update(model.objects.filter(img__in=names).values_list('img', flat=True).distinct())
+        return [(name, entry) for name, entry in batch if name not in referenced]
+
+    def get_orphan_variants(self, batch):
+        return [(name, entry) for name, entry in batch if name not in self.variant_names]
+
+    def get_orphan_uploads(self, batch):
+        """
+        The partial files are named after the ID of their upload, they are kept while the upload is pending.
+        """
+        ids = {}
+        for name, entry in batch:
+            try:
+                ids[name] = str(uuid.UUID(posixpath.splitext(name)[0]))
+            except ValueError:
+                continue
+        pending = {str(pk) for pk in MediaUpload.objects.filter(id__in=list(ids.values()), status=MediaUpload.ChoicesStatusUpload.pending).values_list('id', flat=True)}
+        return [(name, entry) for name, entry in batch if name in ids and ids[name] not in pending]
+
+    def remove_image(self, name):
+        """
+        The references are checked again in the transaction, a record may have been created with the file since the batch was checked.
+        """
+        with transaction.atomic():
+            media_file = MediaFile.objects.select_for_update().filter(name=name).first()
+            if any(model.objects.filter(img=name).exists() for model in MEDIA_MODELS):
+                return False
+            if media_file is not None:
+                media_file.delete()
+            transaction.on_commit(lambda: media_storage.delete(name))
+        return True
+
+    def remove_variant(self, name):
+        media_storage.delete(name)
+        return True
+
+    def remove_upload(self, name):
+        os.remove(os.path.join(settings.UPLOAD_TEMP_DIR, name))
+        return True
+
+    def collect(self, label, files, get_orphans, remove, options):
+        scanned = collected = collected_size = 0
+        for batch in iterate_batches(files, options['batch_size']):
+            scanned += len(batch)
+            for name, entry in get_orphans(batch):
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > self.modified_before:
+                    continue
+                if options['delete'] and not remove(name):
+                    continue
+                collected += 1
+                collected_size += stat.st_size
+                if options['verbosity'] > 1 or not options['delete']:
+                    self.stdout.write(name)
+        action = 'removed' if options['delete'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'{label}: {scanned} files scanned, {collected} orphan files {action} ({collected_size} bytes).'))
+
+    def handle(self, *args, **options):
+        min_age = settings.MEDIA_ORPHAN_MIN_AGE if options['min_age'] is None else options['min_age']
+        self.modified_before = time.time() - min_age
+        self.repair_references(options)
+        self.variant_names = self.get_variant_names(options['batch_size'])
+
+        for model in MEDIA_MODELS:
+            directory = model._meta.get_field('img').upload_to.strip('/')
+            variants_directory = posixpath.join(directory, 'variants')
+            images = iterate_files(media_storage.location, directory, skip={variants_directory})
+            self.collect(f'{model.__name__} images', images, self.get_orphan_images, self.remove_image, options)
+            variants = iterate_files(media_storage.location, variants_directory)
+            self.collect(f'{model.__name__} variants', variants, self.get_orphan_variants, self.remove_variant, options)
+
+        uploads = (item for item in iterate_files(settings.UPLOAD_TEMP_DIR, '') if item[0].endswith('.part'))
+        self.collect('Uploads', uploads, self.get_orphan_uploads, self.remove_upload, options)
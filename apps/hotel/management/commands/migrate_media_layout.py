@@ -0,0 +1,67 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+from apps.hotel.cache import invalidate_viewer_cache
+from apps.hotel.models import HotelMedia, RoomMedia, MediaFile
+from apps.hotel.storage import media_storage
+
+
+class Command(BaseCommand):
+    """
+    Move the HotelMedia and RoomMedia images, and their variants, stored with a previous layout to the current layout of the
+    content addressed storage. The records are processed in batches ordered by ID and each record is moved on its own:
+    the file is copied first, the record is pointed to the copy, and the old file is removed once no record uses it,
+    so the site keeps serving the images while the command runs. The records already moved are skipped without reading
+    their files, so running the command again resumes it.
+    """
+    help = 'Move the hotel and room media files to the sharded layout of the content addressed storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def relocate(self, name, directory):
+        """
+        The file is saved again in the directory given, the "upload_to" of the model for the images, so the directories of
+        the previous layout, like the shards of another depth, are not kept in the new name.
+        """
+        if not name or media_storage.is_sharded(name) or not media_storage.exists(name):
+            return name
+        with media_storage.open(name, 'rb') as file:
+            return media_storage.save(posixpath.join(directory, posixpath.basename(name)), file)
+
+    def migrate_object(self, model, model_object):
+        old_name, old_variants = model_object.img.name, model_object.variants or {}
+        names = [old_name, *(name for formats in old_variants.values() for name in formats.values())]
+        if not old_name or all(media_storage.is_sharded(name) for name in names) or not media_storage.exists(old_name):
+            return False
+        directory = model._meta.get_field('img').upload_to.strip('/')
+        new_name = self.relocate(old_name, directory)
+        new_variants = {size_name: {image_format: self.relocate(name, posixpath.join(directory, 'variants')) for image_format, name in formats.items()} for size_name, formats in old_variants.items()}
+        if new_name == old_name and new_variants == old_variants:
+            return False
+
+        with transaction.atomic():
+            if not model.objects.filter(pk=model_object.pk, img=old_name).update(img=new_name, variants=new_variants, updated_at=timezone.now()):
+                return False
+            if new_name != old_name:
+                #The old variants belong to the old image, they are removed with it once no record uses it.
+                moved_variants = {size_name: {image_format: name for image_format, name in formats.items() if name != new_variants[size_name][image_format]}
+                                  for size_name, formats in old_variants.items()}
+                MediaFile.acquire(self, name=new_name)
+                MediaFile.release(self, name=old_name, variants=moved_variants)
+        return True
+
+    def handle(self, *args, **options):
+        for model in (HotelMedia, RoomMedia):
+            queryset = model.objects.only('id', 'img', 'variants')
+            moved = 0
+            for batch in iterate_queryset_chunks(queryset, options['batch_size']):
+                moved += sum(self.migrate_object(model, model_object) for model_object in batch)
+                invalidate_viewer_cache('hotel', 'room')
+                self.stdout.write(f'{model.__name__}: {moved} records moved, last ID processed {batch[-1].pk}.')
+            self.stdout.write(self.style.SUCCESS(f'{model.__name__}: {moved} records moved.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+from apps.hotel.media import process_media
+from apps.hotel.models import HotelMedia, RoomMedia
+
+
+class Command(BaseCommand):
+    """
+    Process in this process the HotelMedia and RoomMedia images still 'pending', like the ones not queued because the
+    queue of the worker pool was full, the ones queued when the server stopped, or the ones stored before the processing.
+    """
+    help = 'Validate, strip the metadata and generate the variants of the pending hotel and room media.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        for model in (HotelMedia, RoomMedia):
+            queryset = model.objects.filter(status=model.ChoicesStatusMedia.pending).exclude(img='').only('id', 'img')
+            processed = 0
+            for batch in iterate_queryset_chunks(queryset, options['batch_size']):
+                for model_object in batch:
+                    process_media(model, model_object.pk, model_object.img.name)
+                processed += len(batch)
+                self.stdout.write(f'{model.__name__}: {processed} records processed, last ID processed {batch[-1].pk}.')
+            self.stdout.write(self.style.SUCCESS(f'{model.__name__}: {processed} records processed.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+from apps.hotel.cache import invalidate_viewer_cache
+from apps.hotel.models import Room
+
+
+class Command(BaseCommand):
+    """
+    Compute again the bitmask of amenities of every room from its RoomExtra records, for example after adding an amenity
+    or loading links without the signals that keep the bitmasks up to date. The rooms are processed in batches ordered by ID.
+    """
+    help = 'Compute again the bitmask of amenities of the rooms.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        for batch in iterate_queryset_chunks(Room.objects.only('id'), options['batch_size']):
+            with transaction.atomic():
+                Room.update_amenities(self, id_rooms=[room.id for room in batch])
+            total += len(batch)
+        invalidate_viewer_cache('room')
+        self.stdout.write(self.style.SUCCESS(f'{total} rooms updated.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from apps.hotel.search import REBUILD_CHUNK_SIZE, SearchNotAvailable, rebuild_search_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full text index of the hotels and rooms, for example after loading records with "bulk_create" or "update",
+    which do not send the signals that keep the index up to date.
+    """
+    help = 'Rebuild the full text index of the hotels and rooms.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(using=options['database']):
+                total = rebuild_search_index(using=options['database'], chunk_size=options['chunk_size'])
+        except SearchNotAvailable as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{total} documents indexed.'))
@@ -0,0 +1,181 @@
+import logging, posixpath, threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from apps.hotel.cache import invalidate_viewer_cache
+from apps.hotel.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+CLEAN_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+VIEWER_CACHE_NAMESPACES = {'HotelMedia': 'hotel', 'RoomMedia': 'room'}
+
+_executor = None
+_queue_slots = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Pool of MEDIA_PROCESSING_WORKERS threads, at most MEDIA_PROCESSING_QUEUE_SIZE images are queued or in process at once.
+    """
+    global _executor, _queue_slots
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_PROCESSING_WORKERS, thread_name_prefix='media-processing')
+            _queue_slots = threading.BoundedSemaphore(settings.MEDIA_PROCESSING_QUEUE_SIZE)
+    return _executor, _queue_slots
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def open_image(name, storage=media_storage):
+    """
+    Decode the image after checking its dimensions, which are read from the header, so a decompression bomb is never decoded.
+    The orientation of the EXIF data is applied to the pixels, the EXIF data and the rest of the metadata are discarded.
+    """
+    with storage.open(name, 'rb') as file:
+        with Image.open(file) as image:
+            width, height = image.size
+            if max(width, height) > settings.MEDIA_MAX_DIMENSION or width * height > settings.MEDIA_MAX_PIXELS:
+                raise InvalidImage(f'The image of {width}x{height} pixels exceeds the allowed dimensions.')
+            image_format = image.format
+            image.load()
+            image = ImageOps.exif_transpose(image)
+    image.info = {}
+    return image, image_format
+
+
+def store_clean_image(image, image_format, name, storage=media_storage):
+    """
+    Encode the image again without metadata, keeping JPEG, PNG and WebP images in their format and converting the rest to PNG.
+    """
+    image_format = image_format if image_format in CLEAN_FORMATS else 'PNG'
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image_format != 'JPEG' and image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    content = BytesIO()
+    image.save(content, format=image_format, quality=settings.MEDIA_REENCODE_QUALITY)
+    clean_name = posixpath.join(storage.get_base_directory(name), f'image{CLEAN_FORMATS[image_format]}')
+    return storage.save(clean_name, ContentFile(content.getvalue()))
+
+
+def render_variants(image, name, storage=media_storage):
+    """
+    Resize the image to every size of MEDIA_VARIANT_SIZES and encode it in every format of MEDIA_VARIANT_FORMATS.
+    The variants are saved in a "variants" directory next to the images of the content addressed storage, and the result is like
+    {'thumbnail': {'jpeg': 'media_room/variants/ab/cd/<sha256>.jpg', 'webp': ...}, 'card': {...}, ...}.
+    The images are never enlarged, a size greater than the original keeps its dimensions.
+    """
+    image = image.convert('RGB')
+    directory = posixpath.join(storage.get_base_directory(name), 'variants')
+    variants = {}
+    for size_name, size in settings.MEDIA_VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[size_name] = {}
+        for image_format in settings.MEDIA_VARIANT_FORMATS:
+            content = BytesIO()
+            resized.save(content, format=image_format.upper(), quality=settings.MEDIA_VARIANT_QUALITY, optimize=True)
+            variant_name = posixpath.join(directory, f'{size_name}.{VARIANT_FORMATS[image_format]}')
+            variants[size_name][image_format] = storage.save(variant_name, ContentFile(content.getvalue()))
+    return variants
+
+
+def delete_variants(variants, storage=media_storage):
+    for formats in (variants or {}).values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def process_media(model, pk, name):
+    """
+    Validate the uploaded image of a media record, replace it with a copy without metadata and generate its variants.
+    The record becomes 'ready', or 'failed' when the image can not be decoded or is too large, unless it is no longer
+    'pending' with the same image, then the new image is processed on its own.
+    """
+    from apps.hotel.models import MediaFile
+
+    namespace = VIEWER_CACHE_NAMESPACES[model.__name__]
+    pending = model.objects.filter(pk=pk, img=name, status=model.ChoicesStatusMedia.pending)
+    try:
+        image, image_format = open_image(name)
+        clean_name = store_clean_image(image, image_format, name)
+        variants = render_variants(image, clean_name)
+    except Exception as e:
+        logger.warning('The image "%s" could not be processed: %s', name, e)
+        #The viewers only list the 'ready' images, so a failed image does not change their representation.
+        pending.update(status=model.ChoicesStatusMedia.failed)
+        return
+
+    with transaction.atomic():
+        updated = pending.update(img=clean_name, variants=variants, status=model.ChoicesStatusMedia.ready, updated_at=timezone.now())
+        if updated and clean_name != name:
+            MediaFile().acquire(name=clean_name)
+            MediaFile().release(name=name)
+    #The files are shared by every record with the same image, so they are only removed when no record uses them.
+    if not updated and not MediaFile.objects.filter(name=clean_name).exists():
+        media_storage.delete(clean_name)
+        delete_variants(variants)
+    invalidate_viewer_cache(namespace)
+
+
+def process_media_in_worker(model, pk, name, queue_slots):
+    try:
+        process_media(model, pk, name)
+    except Exception:
+        logger.exception('The image "%s" could not be processed.', name)
+    finally:
+        queue_slots.release()
+        connections.close_all()
+
+
+def schedule_processing(model_object):
+    """
+    Process the image in the worker pool once the transaction that saved the record commits, so the request returns as soon as
+    the upload is stored. When the queue is full the record stays 'pending' for the "process_pending_media" command.
+    With MEDIA_PROCESSING_WORKERS set to 0 the image is processed at the commit.
+    """
+    model, pk, name = type(model_object), model_object.pk, model_object.img.name
+
+    def submit():
+        if not settings.MEDIA_PROCESSING_WORKERS:
+            process_media(model, pk, name)
+            return
+        executor, queue_slots = get_executor()
+        if not queue_slots.acquire(blocking=False):
+            logger.warning('The media processing queue is full, "%s" stays pending.', name)
+            return
+        executor.submit(process_media_in_worker, model, pk, name, queue_slots)
+    transaction.on_commit(submit)
+
+
+def is_public_media(name):
+    """
+    The raw upload of a media record is stored before its metadata is removed, so the images of the media directories are
+    only public while a 'ready' record uses them. The variants are always rendered from a processed image.
+    """
+    from apps.hotel.models import HotelMedia, RoomMedia
+
+    for model in (HotelMedia, RoomMedia):
+        directory = model._meta.get_field('img').upload_to.strip('/')
+        if name.startswith(f'{directory}/variants/'):
+            return True
+        if name.startswith(f'{directory}/'):
+            return model.objects.filter(img=name, status=model.ChoicesStatusMedia.ready).exists()
+    return True
+
+
+def get_variant_urls(variants, storage=media_storage):
+    return {size_name: {image_format: storage.url(name) for image_format, name in formats.items()} for size_name, formats in (variants or {}).items()}
@@ -1,12 +1,23 @@
-import os
+import hashlib, os, uuid
 
+from django.conf import settings
+from django.core.files import File
 from django.utils.translation import gettext_lazy as _
-from django.db import models
+from django.db import models, transaction, DEFAULT_DB_ALIAS
+from django.db.models.lookups import Exact
+from django.utils import timezone
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.core.exceptions import ValidationError
-from django.shortcuts import get_object_or_404
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 
 from apps.account.models import Account
+from apps.hotel.cache import invalidate_viewer_cache
+from apps.hotel.media import delete_variants
+from apps.hotel.search import index_objects
+from apps.hotel.storage import get_media_storage, media_storage
+
+UPLOAD_BLOCK_SIZE = 64 * 1024
+#Above this number of bitmask values an amenity filter is a bitwise AND instead of an IN over the indexed column.
+AMENITY_FILTER_MAX_VALUES = 64
 
 # Create your models here.
 
@@ -24,6 +35,8 @@ class Hotel(models.Model):
     class Meta:
         verbose_name = _('Hotel')
         verbose_name_plural = _('Hotel')
+        indexes = [models.Index(fields=['created_at', 'id'], name='hotel_created_at_idx'),
+                   models.Index(fields=['stars'], name='hotel_stars_idx')]
     
     def __str__(self):
         return f'{self.id}-{self.name}'
@@ -41,37 +54,108 @@ class Hotel(models.Model):
 
 
 
+class MediaFile(models.Model):
+    """
+    Number of media records using every stored image. The content addressed storage keeps a single copy of each image,
+    so the file and its variants are only removed when the last record using it is deleted or changes its image.
+    """
+    name = models.CharField(verbose_name=_('File name'), max_length=255, unique=True)
+    references = models.PositiveIntegerField(verbose_name=_('References'), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+    class Meta:
+        verbose_name = _('Media File')
+        verbose_name_plural = _('Media Files')
+
+    def __str__(self):
+        return f'{self.name}-{self.references}'
+
+    def acquire(self, name):
+        MediaFile.objects.get_or_create(name=name)
+        MediaFile.objects.filter(name=name).update(references=models.F('references') + 1)
+
+    def release(self, name, variants=None):
+        """
+        The files stored before the reference counting have no record, they are removed as files with a single reference.
+        The file is removed once the transaction commits, unless a new reference was acquired in the meantime.
+        """
+        if not name:
+            return
+        with transaction.atomic():
+            media_file = MediaFile.objects.select_for_update().filter(name=name).first()
+            if media_file is not None and media_file.references > 1:
+                MediaFile.objects.filter(pk=media_file.pk).update(references=models.F('references') - 1)
+                return
+            if media_file is not None:
+                media_file.delete()
+
+        def remove_file():
+            if not MediaFile.objects.filter(name=name).exists():
+                media_storage.delete(name)
+                delete_variants(variants)
+        transaction.on_commit(remove_file)
+
+    def count_references(self, names):
+        """
+        Number of HotelMedia and RoomMedia records using every name, with a grouped count by model.
+        """
+        references = dict.fromkeys(names, 0)
+        for model in (HotelMedia, RoomMedia):
+            for name, count in model.objects.filter(img__in=names).values('img').annotate(count=models.Count('id')).values_list('img', 'count'):
+                references[name] += count
+        return references
+
+
+
+
 class HotelMedia(models.Model):
+
+    class ChoicesStatusMedia(models.TextChoices):
+        pending = 'pending', _('Pending')
+        ready = 'ready', _('Ready')
+        failed = 'failed', _('Failed')
+
     id_hotel = models.ForeignKey(Hotel, related_name='hotel_media_reference', null=False, unique=False, blank=False, on_delete=models.CASCADE)
-    img = models.ImageField(upload_to='media_hotel/')
+    img = models.ImageField(upload_to='media_hotel/', storage=get_media_storage)
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(verbose_name=_('Status of media'), max_length=10, choices=ChoicesStatusMedia.choices, default=ChoicesStatusMedia.pending)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
     class Meta:
         verbose_name = _('Hotel Media')
         verbose_name_plural = _('Hotel Media')
+        indexes = [models.Index(fields=['status'], name='hotel_media_status_idx'),
+                   models.Index(fields=['img'], name='hotel_media_img_idx')]
     
     def update_model(self, model_object=None, **extra_fields):
         if model_object is None or not isinstance(model_object, HotelMedia):
             raise ValidationError(message=_('The object can`t be updated.'))
         
-        old_img_path = None
+        old_img = None
         if 'img' in extra_fields.keys():
-            old_img_path = model_object.img.path
+            old_img = (model_object.img.name, model_object.variants)
+            model_object.variants = {}
+            model_object.status = model_object.ChoicesStatusMedia.pending
         
         for field, value in extra_fields.items():
             setattr(model_object, field, value)
 
-        if old_img_path is not None:
-            if os.path.exists(old_img_path):
-                os.remove(old_img_path)
-
         model_object.save()
+        if old_img is not None:
+            MediaFile.release(self, *old_img)
         return model_object
-    
-    def delete(self, using=None, keep_parents=False):
-        self.img.delete()
-        super().delete(using=using, keep_parents=keep_parents)
 
+    def save(self, *args, **kwargs):
+        """
+        A new upload is only written to the storage when the record is saved, then the reference to the file is counted.
+        """
+        new_img = bool(self.img) and not self.img._committed
+        super().save(*args, **kwargs)
+        if new_img:
+            MediaFile.acquire(self, name=self.img.name)
+    
 
 
 
@@ -93,6 +177,7 @@ class Room(models.Model):
     price = models.DecimalField(verbose_name=_('Price per night'), unique=False, max_digits=6, decimal_places=2, default=0)
     room_capacity = models.PositiveSmallIntegerField(verbose_name=_('Guest Capacity'), validators=[MinValueValidator(1), MaxValueValidator(10)], default=1)
     num_bed = models.PositiveSmallIntegerField(verbose_name=_('Number of Beds'), validators=[MinValueValidator(1), MaxValueValidator(12)], default=1)
+    amenities = models.PositiveIntegerField(verbose_name=_('Amenities'), default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     updated_by = models.ForeignKey(Account, related_name='update_by_room_reference', null=True, blank=False, on_delete=models.SET_NULL)
@@ -102,6 +187,12 @@ class Room(models.Model):
         verbose_name = _('Room')
         verbose_name_plural = _('Rooms')
         constraints = [models.UniqueConstraint(fields=['name', 'number', 'id_hotel'], name="unique_name_number_per_hotel")]
+        indexes = [models.Index(fields=['id_hotel', 'room_status', 'room_capacity'], name='room_hotel_status_capacity_idx'),
+                   models.Index(fields=['created_at', 'id'], name='room_created_at_idx'),
+                   models.Index(fields=['price'], name='room_price_idx'),
+                   models.Index(fields=['room_status', 'price'], name='room_status_price_idx'),
+                   models.Index(fields=['room_capacity', 'num_bed'], name='room_capacity_bed_idx'),
+                   models.Index(fields=['amenities'], name='room_amenities_idx')]
     
     def __str__(self):
         if self.name and self.number:
@@ -132,30 +223,162 @@ class Room(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
     
+    def get_bulk_errors(self, model_objects=None):
+        """
+        Validate the rooms to be created together, returning a dict of errors per room, empty for the valid ones.
+        The rooms are validated in memory with "full_clean" without its unique checks, which would run a query per room.
+        The "unique_name_number_per_hotel" constraint is checked between the rooms sent and against the stored rooms of the
+        hotel with a single query. Like the constraint, the rooms without a name or a number are never duplicated.
+        """
+        if not model_objects:
+            raise ValidationError(message=_('The rooms to create are necessary.'))
+        errors = [{} for model_object in model_objects]
+        for index, model_object in enumerate(model_objects):
+            try:
+                model_object.full_clean(exclude=['id_hotel', 'updated_by'], validate_unique=False)
+            except ValidationError as e:
+                errors[index] = e.message_dict
+
+        keys = {}
+        for index, model_object in enumerate(model_objects):
+            if model_object.name is None or model_object.number is None:
+                continue
+            key = (model_object.id_hotel_id, model_object.name, model_object.number)
+            if key in keys:
+                errors[index].setdefault(NON_FIELD_ERRORS, []).append(_('The room is repeated in the list sent.'))
+            else:
+                keys[key] = index
+        if keys:
+            stored = Room.objects.filter(id_hotel__in={key[0] for key in keys}, name__in={key[1] for key in keys}, number__in={key[2] for key in keys})
+            for key in stored.values_list('id_hotel', 'name', 'number'):
+                if key in keys:
+                    errors[keys[key]].setdefault(NON_FIELD_ERRORS, []).append(_('A room with this name and number already exists in the hotel.'))
+        return errors
+
+    def bulk_create_rooms(self, model_objects=None, using=DEFAULT_DB_ALIAS):
+        """
+        Insert the rooms validated by "get_bulk_errors" in a single transaction.
+        "bulk_create" does not send the "post_save" signal, so the search documents and the viewer cache are updated here.
+        """
+        if not model_objects:
+            raise ValidationError(message=_('The rooms to create are necessary.'))
+        with transaction.atomic(using=using):
+            model_objects = Room.objects.using(using).bulk_create(model_objects)
+            index_objects(model_objects, using=using)
+        invalidate_viewer_cache('room')
+        return model_objects
+
     def add_rooms(self, model_object=None, id_rooms=None):
+        """
+        Link the rooms to a RoomMedia or RoomExtra record. The IDs are resolved with a single query and every missing ID is
+        reported at once, then the links not stored yet are inserted with a single statement. Nothing is linked when a room is missing.
+        """
         if model_object is None or id_rooms is None:
             raise ValidationError(message=_('The "id_rooms" field and records is necessary.'))
         if not isinstance(id_rooms, list):
             raise ValidationError(message=_('The "id_rooms" field needs to be a list.'))
         try:
-            for id_room in id_rooms:
-                if not isinstance(id_room, Room):
-                    id_room = get_object_or_404(Room, pk=id_room)
-                model_object.id_rooms.add(id_room.id)
-        except Exception as e:
-            raise ValidationError(message=e)
+            ids = {id_room.id if isinstance(id_room, Room) else int(id_room) for id_room in id_rooms}
+        except (TypeError, ValueError):
+            raise ValidationError(message=_('The "id_rooms" field needs to be a list of IDs.'))
+        missing = ids - set(Room.objects.filter(id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise ValidationError(message=_('The rooms %(missing)s do not exist.') % {'missing': sorted(missing)})
+        if ids:
+            model_object.id_rooms.add(*ids)
+
+    def get_amenities(self, amenities):
+        """
+        Flags of every amenity of RoomExtra.AMENITIES from a bitmask, like {'has_internet': True, 'has_tv': False}.
+        """
+        return {name: bool(amenities & (1 << index)) for index, name in enumerate(RoomExtra.AMENITIES)}
+
+    def get_amenities_mask(self, **amenities):
+        return sum(1 << index for index, name in enumerate(RoomExtra.AMENITIES) if amenities.get(name))
+
+    def get_amenities_filter(self, **amenities):
+        """
+        Predicate over the "amenities" bitmask for the amenities required (True) and excluded (False).
+        While the bitmasks satisfying it are at most AMENITY_FILTER_MAX_VALUES, it is an IN over the indexed column.
+        """
+        required = Room.get_amenities_mask(self, **{name: value for name, value in amenities.items() if value})
+        excluded = Room.get_amenities_mask(self, **{name: not value for name, value in amenities.items() if not value})
+        free_bits = [1 << index for index in range(len(RoomExtra.AMENITIES)) if not (required | excluded) & (1 << index)]
+        if 2 ** len(free_bits) > AMENITY_FILTER_MAX_VALUES:
+            return Exact(models.F('amenities').bitand(required | excluded), required)
+        values = [required | sum(bit for position, bit in enumerate(free_bits) if combination & (1 << position)) for combination in range(2 ** len(free_bits))]
+        return models.Q(amenities__in=values)
+
+    def update_amenities(self, id_rooms=None):
+        """
+        Compute again the bitmask of amenities of the rooms from the RoomExtra records linked to them, reading the links with
+        a single query and writing the rooms with one update per distinct bitmask. The "updated_at" field of the rooms is refreshed,
+        their representation changed.
+        """
+        masks = dict.fromkeys(set(id_rooms or []), 0)
+        if not masks:
+            return
+        links = RoomExtra.id_rooms.through.objects.filter(room_id__in=list(masks)).values_list('room_id', *(f'roomextra__{name}' for name in RoomExtra.AMENITIES))
+        for id_room, *flags in links:
+            masks[id_room] |= sum(1 << index for index, flag in enumerate(flags) if flag)
+        rooms_per_mask = {}
+        for id_room, mask in masks.items():
+            rooms_per_mask.setdefault(mask, []).append(id_room)
+        updated_at = timezone.now()
+        for mask, rooms in rooms_per_mask.items():
+            Room.objects.filter(id__in=rooms).update(amenities=mask, updated_at=updated_at)
+
+    def get_query_filtered_rooms(self, queryset=None, id_hotel=None, stars=None, price_min=None, price_max=None, room_capacity=None, num_bed=None,
+                                 room_status=None, has_internet=None, has_tv=None):
+        """
+        Query to filter the rooms, the filters with a None value are not applied.
+        The extras are checked over the bitmask of amenities of the room, without joining the RoomExtra records.
+        """
+        if queryset is None:
+            queryset = Room.objects.all()
+        filters = {'id_hotel': id_hotel, 'id_hotel__stars': stars, 'price__gte': price_min, 'price__lte': price_max, 'room_capacity': room_capacity,
+                   'num_bed': num_bed, 'room_status': room_status}
+        queryset = queryset.filter(**{lookup: value for lookup, value in filters.items() if value is not None})
+        amenities = {name: value for name, value in (('has_internet', has_internet), ('has_tv', has_tv)) if value is not None}
+        if amenities:
+            queryset = queryset.filter(Room.get_amenities_filter(self, **amenities))
+        return queryset
+
+    def get_facets(self, queryset):
+        """
+        Count the rooms of the queryset per hotel star rating and per price bucket, every count is a conditional aggregate of a single query.
+        The price buckets are delimited by the ROOM_PRICE_FACET_BUCKETS setting, the last bucket has no upper limit.
+        """
+        limits = [0, *settings.ROOM_PRICE_FACET_BUCKETS]
+        price_buckets = [(minimum, limits[index + 1] if index + 1 < len(limits) else None) for index, minimum in enumerate(limits)]
+        aggregates = {f'stars_{stars}': models.Count('pk', filter=models.Q(id_hotel__stars=stars)) for stars in range(6)}
+        for index, (minimum, maximum) in enumerate(price_buckets):
+            condition = models.Q(price__gte=minimum) if maximum is None else models.Q(price__gte=minimum, price__lt=maximum)
+            aggregates[f'price_{index}'] = models.Count('pk', filter=condition)
+        values = queryset.order_by().aggregate(**aggregates)
+        return {
+            'stars': {stars: values[f'stars_{stars}'] for stars in range(6)},
+            'price': [{'min': minimum, 'max': maximum, 'count': values[f'price_{index}']} for index, (minimum, maximum) in enumerate(price_buckets)]
+        }
 
     
 
 
 class RoomMedia(models.Model):
+    ChoicesStatusMedia = HotelMedia.ChoicesStatusMedia
+
     id_rooms = models.ManyToManyField(Room, related_name='room_media_reference', blank=False)
-    img = models.ImageField(upload_to='media_room/')
+    img = models.ImageField(upload_to='media_room/', storage=get_media_storage)
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(verbose_name=_('Status of media'), max_length=10, choices=ChoicesStatusMedia.choices, default=ChoicesStatusMedia.pending)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
     class Meta:
         verbose_name = _('Room Media')
         verbose_name_plural = _('Rooms Media')
+        indexes = [models.Index(fields=['status'], name='room_media_status_idx'),
+                   models.Index(fields=['img'], name='room_media_img_idx')]
 
     def create_model(self, **extra_fields):
         if not 'id_rooms' in extra_fields.keys():
@@ -164,11 +387,12 @@ class RoomMedia(models.Model):
             raise ValidationError(message=_('The "id_rooms" field needs to be a list.'))
         try:
             id_rooms = extra_fields.pop('id_rooms')
-            model_object = RoomMedia(
-                **extra_fields
-            )
-            model_object.save()
-            Room.add_rooms(self, model_object=model_object, id_rooms=id_rooms)
+            with transaction.atomic():
+                model_object = RoomMedia(
+                    **extra_fields
+                )
+                model_object.save()
+                Room.add_rooms(self, model_object=model_object, id_rooms=id_rooms)
             return model_object
         except Exception as e:
             raise ValidationError(message=e)
@@ -177,20 +401,27 @@ class RoomMedia(models.Model):
         if model_object is None or not isinstance(model_object, RoomMedia):
             raise ValidationError(message=_('The object can`t be updated.'))
         
-        old_img_path = None
+        old_img = None
         if 'img' in extra_fields.keys():
-            old_img_path = model_object.img.path
+            old_img = (model_object.img.name, model_object.variants)
+            model_object.variants = {}
+            model_object.status = model_object.ChoicesStatusMedia.pending
             setattr(model_object, 'img', extra_fields.get('img'))
 
-        if 'id_rooms' in extra_fields.keys():
-            Room.add_rooms(self, model_object=model_object, id_rooms=extra_fields.get('id_rooms'))
-            
-        if old_img_path is not None:
-            if os.path.exists(old_img_path):
-                os.remove(old_img_path)
+        with transaction.atomic():
+            if 'id_rooms' in extra_fields.keys():
+                Room.add_rooms(self, model_object=model_object, id_rooms=extra_fields.get('id_rooms'))
 
-        model_object.save()
+            model_object.save()
+            if old_img is not None:
+                MediaFile.release(self, *old_img)
         return model_object
+
+    def save(self, *args, **kwargs):
+        new_img = bool(self.img) and not self.img._committed
+        super().save(*args, **kwargs)
+        if new_img:
+            MediaFile.acquire(self, name=self.img.name)
     
     def delete_item_room(self, id_room):
         if id_room is None or not isinstance(id_room, Room):
@@ -201,10 +432,6 @@ class RoomMedia(models.Model):
         except:
             raise ValidationError(message=_('The object can`t delete room selected.'))
     
-    def delete(self, using=None, keep_parents=False):
-        self.img.delete()
-        super().delete(using=using, keep_parents=keep_parents)
-
     def get_query_media_information_from_room(self, room):
         """
         Query to retrieve all media-related information associated with a Room record.
@@ -218,9 +445,13 @@ class RoomMedia(models.Model):
 
 
 class RoomExtra(models.Model):
+    #Bit of every amenity in the "amenities" bitmask of Room, by position. A new amenity is added at the end.
+    AMENITIES = ['has_internet', 'has_tv']
+
     id_rooms = models.ManyToManyField(Room, related_name='room_extra_reference', blank=False)
     has_internet = models.BooleanField(verbose_name=_('Room with internet'), default=False)
     has_tv = models.BooleanField(verbose_name=_('Room with TV'), default=False)  
+    updated_at = models.DateTimeField(auto_now=True)
 
 
     class Meta:
@@ -248,11 +479,12 @@ class RoomExtra(models.Model):
             raise ValidationError(message=_('The "id_rooms" field needs to be a list.'))
         try:
             id_rooms = extra_fields.pop('id_rooms')
-            model_object = RoomExtra(
-                **extra_fields
-            )
-            model_object.save()
-            Room.add_rooms(self, model_object=model_object, id_rooms=id_rooms)
+            with transaction.atomic():
+                model_object = RoomExtra(
+                    **extra_fields
+                )
+                model_object.save()
+                Room.add_rooms(self, model_object=model_object, id_rooms=id_rooms)
             return model_object
         except Exception as e:
             raise ValidationError(message=e)
@@ -261,10 +493,11 @@ class RoomExtra(models.Model):
         if model_object is None or not isinstance(model_object, RoomExtra):
             raise ValidationError(message=_('The object can`t be updated.'))
 
-        if 'id_rooms' in extra_fields.keys():
-            Room.add_rooms(self, model_object=model_object, id_rooms=extra_fields.get('id_rooms'))
-            
-        model_object.save()
+        with transaction.atomic():
+            if 'id_rooms' in extra_fields.keys():
+                Room.add_rooms(self, model_object=model_object, id_rooms=extra_fields.get('id_rooms'))
+
+            model_object.save()
         return model_object
 
     def delete_item_room(self, id_room):
@@ -282,4 +515,119 @@ class RoomExtra(models.Model):
         """
         if not isinstance(room, Room):
             raise ValidationError(message=_('You must enter a Room objects for the search.'))
-        return RoomExtra.objects.filter(id_rooms=room)
\ No newline at end of file
+        return RoomExtra.objects.filter(id_rooms=room)
+
+
+
+class MediaUpload(models.Model):
+    """
+    Resumable upload of a HotelMedia or RoomMedia image sent in chunks. The chunks are appended to a partial file
+    in UPLOAD_TEMP_DIR, "received" is the number of bytes written so far and the offset of the next chunk.
+    """
+
+    class ChoicesKindUpload(models.TextChoices):
+        hotel = 'hotel', _('Hotel')
+        room = 'room', _('Room')
+
+    class ChoicesStatusUpload(models.TextChoices):
+        pending = 'pending', _('Pending')
+        completed = 'completed', _('Completed')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(verbose_name=_('Kind of media'), max_length=10, choices=ChoicesKindUpload.choices)
+    id_hotel = models.ForeignKey(Hotel, related_name='hotel_upload_reference', null=True, blank=True, on_delete=models.CASCADE)
+    id_rooms = models.JSONField(verbose_name=_('Rooms'), default=list, blank=True)
+    filename = models.CharField(verbose_name=_('File name'), max_length=250)
+    size = models.PositiveBigIntegerField(verbose_name=_('Size'))
+    checksum = models.CharField(verbose_name=_('SHA-256 checksum'), max_length=64)
+    received = models.PositiveBigIntegerField(verbose_name=_('Bytes received'), default=0)
+    status = models.CharField(verbose_name=_('Status of upload'), max_length=15, choices=ChoicesStatusUpload.choices, default=ChoicesStatusUpload.pending)
+    media_id = models.BigIntegerField(verbose_name=_('Media created'), null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    updated_by = models.ForeignKey(Account, related_name='update_by_upload_reference', null=True, blank=False, on_delete=models.SET_NULL)
+
+
+    class Meta:
+        verbose_name = _('Media Upload')
+        verbose_name_plural = _('Media Uploads')
+
+    def __str__(self):
+        return f'{self.id}-{self.filename}-{self.received}/{self.size}'
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f'{self.id}.part')
+
+    def write_chunk(self, model_object=None, offset=None, stream=None, length=None):
+        """
+        Append a chunk read from the stream in blocks, so the memory used does not depend on the size of the chunk.
+        The offset must be the number of bytes already received, a client resuming an upload asks for it first.
+        """
+        if model_object is None or not isinstance(model_object, MediaUpload):
+            raise ValidationError(message=_('The object can`t be updated.'))
+        with transaction.atomic():
+            model_object = MediaUpload.objects.select_for_update().get(pk=model_object.pk)
+            if model_object.status != MediaUpload.ChoicesStatusUpload.pending:
+                raise ValidationError(message=_('The upload is already completed.'))
+            if offset != model_object.received:
+                raise ValidationError(message=_('The offset of the chunk must be the number of bytes received: %(received)s.') % {'received': model_object.received})
+            if length is None or model_object.received + length > model_object.size:
+                raise ValidationError(message=_('The chunk exceeds the size of the upload.'))
+
+            os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+            written = 0
+            with open(model_object.temp_path, 'ab') as file:
+                file.truncate(model_object.received)
+                while written < length:
+                    block = stream.read(min(UPLOAD_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    file.write(block)
+                    written += len(block)
+            if written != length:
+                raise ValidationError(message=_('The chunk is incomplete, send it again from the offset %(received)s.') % {'received': model_object.received})
+            model_object.received += written
+            model_object.save(update_fields=['received', 'updated_at'])
+        return model_object
+
+    def get_temp_checksum(self, model_object):
+        sha256 = hashlib.sha256()
+        with open(model_object.temp_path, 'rb') as file:
+            for block in iter(lambda: file.read(UPLOAD_BLOCK_SIZE), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def complete(self, model_object=None):
+        """
+        Verify the checksum of the received file and create the HotelMedia or RoomMedia record with it.
+        The storage reads the partial file in chunks, it is never loaded in memory.
+        """
+        if model_object is None or not isinstance(model_object, MediaUpload):
+            raise ValidationError(message=_('The object can`t be updated.'))
+        if model_object.status != MediaUpload.ChoicesStatusUpload.pending:
+            raise ValidationError(message=_('The upload is already completed.'))
+        if model_object.received != model_object.size:
+            raise ValidationError(message=_('The upload is incomplete, %(received)s of %(size)s bytes received.') % {'received': model_object.received, 'size': model_object.size})
+        if MediaUpload.get_temp_checksum(self, model_object) != model_object.checksum:
+            raise ValidationError(message=_('The checksum of the received file does not match, the upload must be started again.'))
+
+        with transaction.atomic(), open(model_object.temp_path, 'rb') as file:
+            img = File(file, name=model_object.filename)
+            if model_object.kind == MediaUpload.ChoicesKindUpload.hotel:
+                media_object = HotelMedia.objects.create(id_hotel=model_object.id_hotel, img=img)
+            else:
+                media_object = RoomMedia.create_model(self, id_rooms=list(model_object.id_rooms), img=img)
+            model_object.status = MediaUpload.ChoicesStatusUpload.completed
+            model_object.media_id = media_object.id
+            model_object.save(update_fields=['status', 'media_id', 'updated_at'])
+        MediaUpload.delete_temp_file(self, model_object)
+        return media_object
+
+    def delete_temp_file(self, model_object):
+        if os.path.exists(model_object.temp_path):
+            os.remove(model_object.temp_path)
+
+    def delete(self, using=None, keep_parents=False):
+        MediaUpload.delete_temp_file(self, self)
+        super().delete(using=using, keep_parents=keep_parents)
@@ -0,0 +1,193 @@
+import abc, re
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+
+SEARCH_TABLE = 'hotel_search_index'
+REBUILD_CHUNK_SIZE = 1000
+
+
+class SearchNotAvailable(NotImplementedError):
+    """
+    The database has no full text search supported by the index.
+    """
+    pass
+
+
+
+
+class BaseSearchIndex(abc.ABC):
+    """
+    Full text index over the name and description of the hotels and rooms, one document per record identified by its
+    kind ('hotel' or 'room') and its ID. The name is weighted over the description when ranking the results.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get_terms(self, text):
+        """
+        Only the words of the text are used to build the query, so the operators of the full text syntax can not be injected.
+        """
+        return re.findall(r'\w+', text or '')
+
+    @abc.abstractmethod
+    def create_table(self):
+        pass
+
+    @abc.abstractmethod
+    def upsert(self, kind, documents):
+        pass
+
+    def delete(self, kind, ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE kind = %s AND object_id = %s', [(kind, id) for id in ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    @abc.abstractmethod
+    def search(self, text, kind=None, limit=20):
+        """
+        Return a list of (kind, object_id, rank) ordered by relevance, the greater the rank the more relevant the document.
+        """
+        pass
+
+
+
+
+class SQLiteSearchIndex(BaseSearchIndex):
+    """
+    FTS5 virtual table, the results are ranked with bm25. The columns of a FTS5 table have no index, so every document is
+    stored with the rowid "object_id * 2 + kind bit" and is replaced or deleted by that rowid instead of by its columns.
+    """
+    KIND_BITS = {'hotel': 0, 'room': 1}
+
+    def get_rowid(self, kind, id):
+        return int(id) * 2 + self.KIND_BITS[kind]
+
+    def create_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                           f"kind UNINDEXED, object_id UNINDEXED, name, description, tokenize='unicode61 remove_diacritics 2')")
+
+    def upsert(self, kind, documents):
+        documents = list(documents)
+        self.delete(kind, [id for id, name, description in documents])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, name, description) VALUES (%s, %s, %s, %s, %s)',
+                               [(self.get_rowid(kind, id), kind, id, name or '', description or '') for id, name, description in documents])
+
+    def delete(self, kind, ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(self.get_rowid(kind, id),) for id in ids])
+
+    def search(self, text, kind=None, limit=20):
+        terms = self.get_terms(text)
+        if not terms:
+            return []
+        query = ' '.join(f'"{term}"*' for term in terms)
+        sql = f'SELECT kind, object_id, -bm25({SEARCH_TABLE}, 0, 0, 10.0, 1.0) AS rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        params = [query]
+        if kind is not None:
+            sql += ' AND kind = %s'
+            params.append(kind)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'{sql} ORDER BY rank DESC LIMIT %s', [*params, limit])
+            return [(kind, int(object_id), rank) for kind, object_id, rank in cursor.fetchall()]
+
+
+
+
+class PostgreSQLSearchIndex(BaseSearchIndex):
+    """
+    Table with a weighted tsvector per document and a GIN index, the results are ranked with ts_rank.
+    """
+    config = 'simple'
+
+    def create_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (kind varchar(10) NOT NULL, object_id bigint NOT NULL, '
+                           f'document tsvector NOT NULL, PRIMARY KEY (kind, object_id))')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)')
+
+    def upsert(self, kind, documents):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (kind, object_id, document) "
+                               f"VALUES (%s, %s, setweight(to_tsvector('{self.config}', %s), 'A') || setweight(to_tsvector('{self.config}', %s), 'B')) "
+                               f"ON CONFLICT (kind, object_id) DO UPDATE SET document = EXCLUDED.document",
+                               [(kind, id, name or '', description or '') for id, name, description in documents])
+
+    def search(self, text, kind=None, limit=20):
+        terms = self.get_terms(text)
+        if not terms:
+            return []
+        query = ' & '.join(f'{term}:*' for term in terms)
+        sql = (f"SELECT kind, object_id, ts_rank(document, query) AS rank FROM {SEARCH_TABLE}, to_tsquery('{self.config}', %s) query "
+               f"WHERE document @@ query")
+        params = [query]
+        if kind is not None:
+            sql += ' AND kind = %s'
+            params.append(kind)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'{sql} ORDER BY rank DESC LIMIT %s', [*params, limit])
+            return [(kind, int(object_id), rank) for kind, object_id, rank in cursor.fetchall()]
+
+
+
+
+SEARCH_INDEX_CLASSES = {'sqlite': SQLiteSearchIndex, 'postgresql': PostgreSQLSearchIndex}
+
+
+def has_search_index(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor in SEARCH_INDEX_CLASSES
+
+
+def get_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    The search is refused on the other databases instead of scanning every record.
+    """
+    connection = connections[using]
+    if connection.vendor not in SEARCH_INDEX_CLASSES:
+        raise SearchNotAvailable(f'The full text search is not available for the "{connection.vendor}" database.')
+    return SEARCH_INDEX_CLASSES[connection.vendor](connection)
+
+
+def get_search_kind(model_object):
+    from apps.hotel.models import Hotel, Room
+    return {Hotel: 'hotel', Room: 'room'}.get(type(model_object))
+
+
+def index_objects(model_objects, using=DEFAULT_DB_ALIAS):
+    """
+    Add or replace the documents of the records, all of them must be of the same model. Nothing is indexed on the databases
+    without full text search, so the writes of the records never fail because of the index.
+    """
+    model_objects = list(model_objects)
+    if model_objects and has_search_index(using):
+        documents = [(model_object.id, model_object.name, model_object.description) for model_object in model_objects]
+        get_search_index(using).upsert(get_search_kind(model_objects[0]), documents)
+
+
+def remove_objects(model_objects, using=DEFAULT_DB_ALIAS):
+    model_objects = list(model_objects)
+    if model_objects and has_search_index(using):
+        get_search_index(using).delete(get_search_kind(model_objects[0]), [model_object.id for model_object in model_objects])
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Index again every hotel and room, reading the records in chunks so the memory used does not depend on the catalogue size.
+    """
+    from apps.hotel.models import Hotel, Room
+    search_index = get_search_index(using)
+    search_index.create_table()
+    search_index.clear()
+    total = 0
+    for model in (Hotel, Room):
+        for chunk in iterate_queryset_chunks(model.objects.using(using).only('id', 'name', 'description'), chunk_size):
+            index_objects(chunk, using=using)
+            total += len(chunk)
+    return total
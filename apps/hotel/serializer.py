@@ -1,10 +1,16 @@
+import os, re
+
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.db.models import Prefetch
 from rest_framework import serializers
 
+from hotelsolution.serializer import SparseFieldsetMixin
 from apps.account.models import Account
-from apps.hotel.models import Hotel, HotelMedia, Room, RoomMedia, RoomExtra
+from apps.hotel.media import get_variant_urls
+from apps.hotel.models import Hotel, HotelMedia, Room, RoomMedia, RoomExtra, MediaUpload
 
-class HotelRegisterSerializer(serializers.ModelSerializer):
+class HotelRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the Hotel model.
     """
@@ -15,36 +21,52 @@ class HotelRegisterSerializer(serializers.ModelSerializer):
         model = Hotel
         fields = ['id', 'name', 'address', 'description', 'stars', 'updated_by']
 
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('updated_by'):
+            queryset = queryset.select_related('updated_by')
+        return queryset
+
     def update(self, model_object, validated_data):
         return self.Meta.model.update_model(self, model_object=model_object, **validated_data)
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
         return representation
 
 
 
 
-class HotelMediaRegisterSerializer(serializers.ModelSerializer):
+class HotelMediaRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the HotelMedia model.
     """
     id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id')
+    img = serializers.FileField()
 
 
     class Meta:
         model = HotelMedia
-        fields = ['id', 'id_hotel', 'img']
+        fields = ['id', 'id_hotel', 'img', 'status']
+        read_only_fields = ['status']
+
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('id_hotel'):
+            queryset = queryset.select_related('id_hotel')
+        return queryset
     
     def update(self, model_object, validated_data):
         return self.Meta.model.update_model(self, model_object=model_object, **validated_data)
 
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
+        if self.is_field_requested('id_hotel'):
+            representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
         return representation
 
 
@@ -59,7 +81,7 @@ class RoomDeleteItemSerializer(serializers.Serializer):
 
 
 
-class RoomRegisterSerializer(serializers.ModelSerializer):
+class RoomRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the Room model.
     """
@@ -70,31 +92,95 @@ class RoomRegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Room
         fields = ['id', 'id_hotel', 'name', 'description', 'number', 'room_status', 'price', 'room_capacity', 'num_bed', 'updated_by']
+
+    def setup_eager_loading(self, queryset):
+        related = [field for field in ('id_hotel', 'updated_by') if self.is_field_requested(field)]
+        return queryset.select_related(*related) if related else queryset
     
     def update(self, model_object, validated_data):
         return self.Meta.model.update_model(self, model_object=model_object, **validated_data)
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
+        if self.is_field_requested('id_hotel'):
+            representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
         return representation
 
 
 
 
-class RoomMediaRegisterSerializer(serializers.ModelSerializer):
+class RoomBulkItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for every room of the bulk creation, the hotel is common to all of them.
+    """
+
+    class Meta:
+        model = Room
+        fields = ['name', 'description', 'number', 'room_status', 'price', 'room_capacity', 'num_bed']
+
+
+
+
+class RoomBulkRegisterSerializer(serializers.Serializer):
+    """
+    Serializer for creating the rooms of a hotel in a single request, the errors of the rooms are returned by position.
+    """
+    id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id')
+    rooms = RoomBulkItemSerializer(many=True, allow_empty=False)
+
+    def validate_rooms(self, rooms):
+        if len(rooms) > settings.ROOM_BULK_MAX_SIZE:
+            raise serializers.ValidationError(_('A maximum of %(size)s rooms can be created at once.') % {'size': settings.ROOM_BULK_MAX_SIZE})
+        return rooms
+
+    def validate(self, data):
+        data['rooms'] = [Room(id_hotel=data['id_hotel'], **fields) for fields in data['rooms']]
+        errors = Room.get_bulk_errors(self, model_objects=data['rooms'])
+        if any(errors):
+            raise serializers.ValidationError({'rooms': errors})
+        return data
+
+    def create(self, validated_data):
+        for model_object in validated_data['rooms']:
+            model_object.updated_by = validated_data.get('updated_by')
+        return Room.bulk_create_rooms(self, model_objects=validated_data['rooms'])
+
+
+
+
+class RoomIdListField(serializers.ListField):
+    """
+    List of room IDs, the existence of the rooms is checked by "Room.add_rooms" with the single query that links them,
+    so every missing ID is reported at once without querying the rooms twice.
+    """
+    child = serializers.IntegerField()
+
+
+
+
+class RoomMediaRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the RoomMedia model.
     """
-    id_rooms = serializers.SlugRelatedField(queryset=Room.objects.all(), slug_field='id', many=True)
+    id_rooms = RoomIdListField(write_only=True)
+    img = serializers.FileField()
 
 
     class Meta:
         model = RoomMedia
-        fields = ['id', 'id_rooms', 'img']
+        fields = ['id', 'id_rooms', 'img', 'status']
+        read_only_fields = ['status']
+
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('id_rooms'):
+            queryset = queryset.prefetch_related(Prefetch('id_rooms', queryset=Room.objects.select_related('id_hotel')))
+        return queryset
     
     def create(self, validated_data):
         return self.Meta.model.create_model(self, **validated_data)
@@ -104,22 +190,28 @@ class RoomMediaRegisterSerializer(serializers.ModelSerializer):
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['id_rooms'] = [{'id_room': element.id, 'id_hotel': element.id_hotel.id} for element in instance.id_rooms.all() ]
+        if self.is_field_requested('id_rooms'):
+            representation['id_rooms'] = [{'id_room': element.id, 'id_hotel': element.id_hotel.id} for element in instance.id_rooms.all() ]
         return representation
 
 
 
 
-class RoomExtraRegisterSerializer(serializers.ModelSerializer):
+class RoomExtraRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the RoomExtra model.
     """
-    id_rooms = serializers.SlugRelatedField(queryset=Room.objects.all(), slug_field='id', many=True)
+    id_rooms = RoomIdListField(write_only=True)
 
 
     class Meta:
         model = RoomExtra
         fields = ['id', 'id_rooms', 'has_internet', 'has_tv']
+
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('id_rooms'):
+            queryset = queryset.prefetch_related(Prefetch('id_rooms', queryset=Room.objects.select_related('id_hotel')))
+        return queryset
     
     def create(self, validated_data):
         return self.Meta.model.create_or_update_model(self, **validated_data)
@@ -129,13 +221,124 @@ class RoomExtraRegisterSerializer(serializers.ModelSerializer):
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['id_rooms'] = [{'id_room': element.id, 'id_hotel': element.id_hotel.id} for element in instance.id_rooms.all() ]
+        if self.is_field_requested('id_rooms'):
+            representation['id_rooms'] = [{'id_room': element.id, 'id_hotel': element.id_hotel.id} for element in instance.id_rooms.all() ]
         return representation
 
 
 
 
-class HotelSimplifyViewerSerializer(serializers.ModelSerializer):
+class MediaUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer to start a resumable upload of a HotelMedia ("id_hotel") or RoomMedia ("id_rooms") image.
+    """
+    id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id', required=False, allow_null=True)
+    id_rooms = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+    class Meta:
+        model = MediaUpload
+        fields = ['id', 'kind', 'id_hotel', 'id_rooms', 'filename', 'size', 'checksum', 'received', 'status', 'media_id']
+        read_only_fields = ['received', 'status', 'media_id']
+
+    def validate_filename(self, value):
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        if value < 1 or value > settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(_('The size must be between 1 and %(max)s bytes.') % {'max': settings.UPLOAD_MAX_SIZE})
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.match(r'^[0-9a-f]{64}$', value):
+            raise serializers.ValidationError(_('The checksum must be the hexadecimal SHA-256 of the file.'))
+        return value
+
+    def validate(self, attrs):
+        if attrs['kind'] == MediaUpload.ChoicesKindUpload.hotel and attrs.get('id_hotel') is None:
+            raise serializers.ValidationError(_('Do you need send the "id_hotel" field.'))
+        if attrs['kind'] == MediaUpload.ChoicesKindUpload.room:
+            id_rooms = set(attrs.get('id_rooms') or [])
+            if not id_rooms:
+                raise serializers.ValidationError(_('Do you need send the "id_rooms" field.'))
+            missing = id_rooms - set(Room.objects.filter(id__in=id_rooms).values_list('id', flat=True))
+            if missing:
+                raise serializers.ValidationError(_('The rooms %(missing)s do not exist.') % {'missing': sorted(missing)})
+        return attrs
+
+    def to_representation(self, instance):
+        representation =  super().to_representation(instance)
+        representation['chunk_size'] = settings.UPLOAD_CHUNK_MAX_SIZE
+        return representation
+
+
+
+
+class RoomFilterSerializer(serializers.Serializer):
+    """
+    Serializer to validate the filters of the room viewer, the filters not sent are validated as None.
+    """
+    id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id', required=False, allow_null=True, default=None)
+    stars = serializers.IntegerField(min_value=0, max_value=5, required=False, allow_null=True, default=None)
+    price_min = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False, allow_null=True, default=None)
+    price_max = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False, allow_null=True, default=None)
+    room_capacity = serializers.IntegerField(min_value=1, required=False, allow_null=True, default=None)
+    num_bed = serializers.IntegerField(min_value=1, required=False, allow_null=True, default=None)
+    room_status = serializers.ChoiceField(choices=Room.ChoicesStatusRoom.choices, required=False, allow_null=True, default=None)
+    has_internet = serializers.BooleanField(required=False, allow_null=True, default=None)
+    has_tv = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs['price_min'] is not None and attrs['price_max'] is not None and attrs['price_min'] > attrs['price_max']:
+            raise serializers.ValidationError(_('The "price_min" field cannot be greater than the "price_max" field.'))
+        return attrs
+
+
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """
+    Serializer to validate the parameters of a full text search over the hotels and rooms.
+    """
+    q = serializers.CharField(max_length=250)
+    kind = serializers.ChoiceField(choices=['hotel', 'room'], required=False, allow_null=True, default=None)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+
+
+class HotelSearchResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Serializer for Hotel model display in the full text search results.
+    """
+
+    class Meta:
+        model = Hotel
+        fields = ['id', 'name', 'description', 'stars']
+
+
+
+
+class RoomSearchResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Serializer for Room model display in the full text search results.
+    """
+
+    class Meta:
+        model = Room
+        fields = ['id', 'id_hotel', 'name', 'description', 'number', 'price', 'room_capacity']
+
+    def to_representation(self, instance):
+        representation =  super().to_representation(instance)
+        if self.is_field_requested('id_hotel'):
+            representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'stars': instance.id_hotel.stars}
+        return representation
+
+
+
+
+class HotelSimplifyViewerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Simplified serializer for Hotel model display
     """
@@ -145,14 +348,31 @@ class HotelSimplifyViewerSerializer(serializers.ModelSerializer):
         model = Hotel
         fields = ['id', 'name', 'address', 'description', 'stars', 'media']
 
+    def setup_eager_loading(self, queryset):
+        """
+        Load in bulk the relations used by the representation, so the number of queries does not depend on the number of records.
+        The relations of the fields omitted with "?fields=" or "?exclude=" are not loaded.
+        """
+        if self.is_field_requested('updated_by'):
+            queryset = queryset.select_related('updated_by')
+        if self.is_field_requested('media'):
+            queryset = queryset.prefetch_related(Prefetch('hotel_media_reference', queryset=HotelMedia.objects.filter(status=HotelMedia.ChoicesStatusMedia.ready)))
+        return queryset
+
     def get_media(self, hotel):
-        return [{'id':item.id, 'img':item.img.url} for item in HotelMedia.objects.filter(id_hotel=hotel)]
+        """
+        Only the images already processed are listed, the 'pending' ones keep their metadata and the 'failed' ones are not valid images.
+        """
+        return [{'id':item.id, 'img':item.img.url, 'variants':get_variant_urls(item.variants)} for item in hotel.hotel_media_reference.all()]
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
         return representation
     
 
@@ -169,14 +389,21 @@ class HotelCompleteViewerSerializer(HotelSimplifyViewerSerializer):
         model = Hotel
         fields = ['id', 'name', 'address', 'description', 'stars', 'media', 'room']
 
+    def setup_eager_loading(self, queryset):
+        queryset = super().setup_eager_loading(queryset)
+        if self.is_field_requested('room'):
+            rooms = Room.objects.order_by('id').prefetch_related(Prefetch('room_media_reference', queryset=RoomMedia.objects.filter(status=RoomMedia.ChoicesStatusMedia.ready)))
+            queryset = queryset.prefetch_related(Prefetch('hotel_reference', queryset=rooms))
+        return queryset
+
     def get_room(self, hotel):
         return [{'id':item.id, 'name':item.name, 'number':item.number, 'description':item.description, 'price':item.price, 'room_status':item.room_status, 'room_capacity':item.room_capacity, 'num_bed':item.num_bed, 
-                 'media':[{'id':item_media.id, 'img':item_media.img.url} for item_media in RoomMedia.get_query_media_information_from_room(self, room=item)]} for item in Room.objects.filter(id_hotel=hotel)]
+                 'media':[{'id':item_media.id, 'img':item_media.img.url, 'variants':get_variant_urls(item_media.variants)} for item_media in item.room_media_reference.all()]} for item in hotel.hotel_reference.all()]
     
 
 
 
-class RoomViewerSerializer(serializers.ModelSerializer):
+class RoomViewerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for Room model display
     """
@@ -187,16 +414,35 @@ class RoomViewerSerializer(serializers.ModelSerializer):
         model = Room
         fields = ['id', 'id_hotel', 'name', 'description', 'number', 'room_status', 'price', 'room_capacity', 'num_bed', 'media', 'extra']
     
+    def setup_eager_loading(self, queryset):
+        """
+        Load in bulk the relations used by the representation, so the number of queries does not depend on the number of records.
+        The relations of the fields omitted with "?fields=" or "?exclude=" are not loaded.
+        """
+        related = [field for field in ('id_hotel', 'updated_by') if self.is_field_requested(field)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.is_field_requested('media'):
+            queryset = queryset.prefetch_related(Prefetch('room_media_reference', queryset=RoomMedia.objects.filter(status=RoomMedia.ChoicesStatusMedia.ready)))
+        return queryset
+
     def get_media(self, room):
-        return [{'id':item.id, 'img':item.img.url} for item in RoomMedia.get_query_media_information_from_room(self, room=room)]
+        return [{'id':item.id, 'img':item.img.url, 'variants':get_variant_urls(item.variants)} for item in room.room_media_reference.all()]
     
     def get_extra(self, room):
-        return [{**item} for item in RoomExtra.get_query_extra_information_from_room(self, room=room)]
+        """
+        The extras of every RoomExtra record linked to the room are merged in its bitmask of amenities.
+        """
+        return Room.get_amenities(self, room.amenities)
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
+        if self.is_field_requested('id_hotel'):
+            representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'address': instance.id_hotel.address, 'description': instance.id_hotel.description}
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
         return representation
\ No newline at end of file
@@ -0,0 +1,135 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.hotel.cache import invalidate_viewer_cache
+from apps.hotel.models import Hotel, HotelMedia, MediaFile, Room, RoomMedia, RoomExtra
+from apps.hotel.media import schedule_processing
+from apps.hotel.search import get_search_index, has_search_index, index_objects, remove_objects
+
+
+@receiver([post_save, post_delete], sender=Hotel)
+def invalidate_hotel(sender, **kwargs):
+    """
+    The hotel data is also nested in the room representation.
+    """
+    invalidate_viewer_cache('hotel', 'room')
+
+
+@receiver([post_save, post_delete], sender=HotelMedia)
+def invalidate_hotel_media(sender, **kwargs):
+    invalidate_viewer_cache('hotel')
+
+
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=RoomMedia)
+@receiver([post_save, post_delete], sender=RoomExtra)
+def invalidate_room(sender, **kwargs):
+    invalidate_viewer_cache('room')
+
+
+@receiver(m2m_changed, sender=RoomMedia.id_rooms.through)
+@receiver(m2m_changed, sender=RoomExtra.id_rooms.through)
+def invalidate_room_relations(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_viewer_cache('room')
+
+
+@receiver(post_delete, sender=HotelMedia)
+@receiver(post_delete, sender=RoomMedia)
+def release_media_file(sender, instance, **kwargs):
+    """
+    The reference to the image is released for every deleted record, also for the ones deleted in cascade with their hotel
+    or in a queryset, which do not call "delete" on the record.
+    """
+    MediaFile.release(instance, name=instance.img.name, variants=instance.variants)
+
+
+@receiver(post_delete, sender=HotelMedia)
+def touch_hotel(sender, instance, **kwargs):
+    """
+    Removing a media record changes the representation of its hotel, so its "updated_at" field is refreshed for the Last-Modified header.
+    """
+    Hotel.objects.filter(id=instance.id_hotel_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=RoomMedia)
+@receiver(pre_delete, sender=RoomExtra)
+def touch_rooms(sender, instance, **kwargs):
+    """
+    Removing a media or extra record, or unlinking it from some rooms, changes the representation of the rooms,
+    so their "updated_at" field is refreshed for the Last-Modified header.
+    """
+    Room.objects.filter(id__in=instance.id_rooms.all()).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=RoomMedia.id_rooms.through)
+@receiver(m2m_changed, sender=RoomExtra.id_rooms.through)
+def touch_unlinked_rooms(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_remove' and not reverse:
+        Room.objects.filter(id__in=pk_set).update(updated_at=timezone.now())
+    elif action == 'pre_clear' and not reverse:
+        touch_rooms(sender, instance)
+
+
+@receiver(m2m_changed, sender=RoomExtra.id_rooms.through)
+def update_linked_amenities(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    The bitmask of amenities of a room is derived from its RoomExtra records, so it is computed again when the links change.
+    """
+    if action == 'pre_clear':
+        instance._cleared_rooms = [instance.pk] if reverse else list(instance.id_rooms.values_list('id', flat=True))
+    elif action == 'post_clear':
+        Room.update_amenities(instance, id_rooms=getattr(instance, '_cleared_rooms', None))
+    elif action in ('post_add', 'post_remove'):
+        Room.update_amenities(instance, id_rooms=[instance.pk] if reverse else pk_set)
+
+
+@receiver(post_save, sender=RoomExtra)
+def update_extra_amenities(sender, instance, created, **kwargs):
+    if not created:
+        Room.update_amenities(instance, id_rooms=instance.id_rooms.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=RoomExtra)
+def remember_extra_rooms(sender, instance, **kwargs):
+    instance._linked_rooms = list(instance.id_rooms.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=RoomExtra)
+def update_deleted_extra_amenities(sender, instance, **kwargs):
+    Room.update_amenities(instance, id_rooms=getattr(instance, '_linked_rooms', None))
+
+
+@receiver(post_migrate)
+def create_search_table(sender, using, **kwargs):
+    """
+    The full text index is not a model, so its table is created after the migrations of the app.
+    """
+    if sender.name == 'apps.hotel' and has_search_index(using):
+        get_search_index(using).create_table()
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(post_save, sender=Room)
+def index_search_document(sender, instance, using, **kwargs):
+    """
+    The document is written in the same transaction as the record, so the index never gets ahead of the data.
+    """
+    index_objects([instance], using=using)
+
+
+@receiver(post_delete, sender=Hotel)
+@receiver(post_delete, sender=Room)
+def remove_search_document(sender, instance, using, **kwargs):
+    remove_objects([instance], using=using)
+
+
+@receiver(post_save, sender=HotelMedia)
+@receiver(post_save, sender=RoomMedia)
+def process_media_image(sender, instance, **kwargs):
+    """
+    A new image, or an image replaced by "update_model", is 'pending' until it is validated and its variants are generated.
+    """
+    if instance.img and instance.status == instance.ChoicesStatusMedia.pending:
+        schedule_processing(instance)
@@ -0,0 +1,81 @@
+import hashlib, os, posixpath, re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its content, keeping the directory and the extension.
+    Saving a content that is already stored writes nothing and returns the existing name, so every distinct image is kept once.
+    The MediaFile model counts the records using each name.
+    The files are spread in subdirectories named after the first characters of the hash, like "media_room/ab/cd/abcd<...>.png"
+    with the default "shard_depth" and "shard_width", so no directory holds more than a fraction of the files.
+    """
+    hash_pattern = re.compile(r'^[0-9a-f]{64}$')
+
+    def __init__(self, shard_depth=2, shard_width=2, **kwargs):
+        super().__init__(**kwargs)
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+
+    def get_shard_name(self, directory, digest, extension):
+        shards = [digest[index * self.shard_width:(index + 1) * self.shard_width] for index in range(self.shard_depth)]
+        return posixpath.join(directory, *shards, f'{digest}{extension}')
+
+    def is_sharded(self, name):
+        """
+        Whether the name follows the current layout, the names of the files stored before it are moved by the "migrate_media_layout" command.
+        """
+        path, filename = posixpath.split(name)
+        digest, extension = posixpath.splitext(filename)
+        if not self.hash_pattern.match(digest):
+            return False
+        parts = path.split('/')
+        if len(parts) < self.shard_depth:
+            return False
+        directory = '/'.join(parts[:len(parts) - self.shard_depth])
+        return self.get_shard_name(directory, digest, extension) == name
+
+    def get_base_directory(self, name):
+        """
+        Directory of the name without the subdirectories of the layout, like "media_room" for "media_room/ab/cd/abcd<...>.png".
+        """
+        directory = posixpath.dirname(name)
+        if self.is_sharded(name):
+            directory = '/'.join(directory.split('/')[:-self.shard_depth]) if self.shard_depth else directory
+        return directory
+
+    def get_content_hash(self, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        return sha256.hexdigest()
+
+    def get_content_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return self.get_shard_name(directory, self.get_content_hash(content), extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            #The modification time is refreshed, "collect_orphan_media" does not remove a file saved again recently.
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+
+media_storage = ContentAddressedStorage(shard_depth=settings.MEDIA_SHARD_DEPTH, shard_width=settings.MEDIA_SHARD_WIDTH)
+
+
+def get_media_storage():
+    return media_storage
@@ -1,14 +1,25 @@
-import time, os
+import time, os, hashlib, shutil, tempfile, uuid
+from io import BytesIO, StringIO
+from unittest import mock
 from faker import Faker
-
-from django.test import TestCase
+from PIL import Image
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 
 from rest_framework.test import APITransactionTestCase
 
 from apps.account.tests import test_generate_account_data
-from apps.hotel.models import Account, Hotel, HotelMedia, Room, RoomMedia, RoomExtra
+from apps.hotel.models import Account, Hotel, HotelMedia, MediaFile, Room, RoomMedia, RoomExtra
+from apps.hotel.search import SEARCH_TABLE, SearchNotAvailable, get_search_index
 
 
 # Create your tests here.
@@ -18,6 +29,19 @@ PASSWORD = '12345678*Abc'
 IMG_PATH_1= r'.\\media\\media_tests\\img_default_1.png'
 
 
+def test_use_temporary_media_root(test_case):
+    """
+    Store the files of the test in a temporary MEDIA_ROOT removed after the test, the storage follows the setting.
+    Inside a TestCase the removals registered with "on_commit" never run, so the files would stay in the real MEDIA_ROOT.
+    """
+    directory = tempfile.mkdtemp()
+    settings_override = override_settings(MEDIA_ROOT=directory)
+    settings_override.enable()
+    test_case.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    test_case.addCleanup(settings_override.disable)
+    return directory
+
+
 def test_generate_hotel_data(account):
     data_object = {
         'name' : fake.name(),
@@ -45,6 +69,12 @@ def test_generate_hotel_media_view_data(hotel, name_file='hotel_media_test_examp
     return data_object
 
 
+def test_generate_image_content(width=1200, height=900, image_format='PNG'):
+    content = BytesIO()
+    Image.new('RGB', (width, height), color=(30, 120, 200)).save(content, format=image_format)
+    return content.getvalue()
+
+
 def test_generate_room_data(hotel, account, room_status=Room.ChoicesStatusRoom.available):
     data_object = {
         'id_hotel' : hotel,
@@ -169,6 +199,7 @@ class HotelMediaTestCase(TestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
     
     def setUp(self):
+        test_use_temporary_media_root(self)
         self.model = HotelMedia
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.hotel =  Hotel.objects.create(**test_generate_hotel_data(account=self.account))
@@ -188,6 +219,143 @@ class HotelMediaTestCase(TestCase):
         self.assertTrue(self.model.objects.filter(id=self.model_object.id).exists())
         self.assertEqual(self.model_object.id_hotel, self.hotel)    
     
+    @override_settings(MEDIA_PROCESSING_WORKERS=0)
+    def test_correct_variants_model(self):
+        """
+        Test to verify that every size and format is generated without enlarging the image, and that the variants are removed with the record.
+        """
+        self.data_object['img'] = SimpleUploadedFile(name='hotel_media_test_example.png', content=test_generate_image_content(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            model_object = self.model.objects.create(**self.data_object)
+        model_object.refresh_from_db()
+        self.assertEqual(model_object.status, self.model.ChoicesStatusMedia.ready)
+        self.assertEqual(set(model_object.variants), {'thumbnail', 'card', 'full'})
+        storage = model_object.img.storage
+        with storage.open(model_object.variants['thumbnail']['webp']) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (320, 240))
+        with storage.open(model_object.variants['full']['jpeg']) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (1200, 900))
+        variant_names = [name for formats in model_object.variants.values() for name in formats.values()]
+        self.model_object = None
+        with self.captureOnCommitCallbacks(execute=True):
+            model_object.delete()
+        self.assertFalse(any(storage.exists(name) for name in variant_names))
+
+    def test_correct_deduplicated_model(self):
+        """
+        Test to verify that the same image is stored once, and the file is only removed with the last record using it.
+        """
+        content = test_generate_image_content(width=17, height=13)
+        model_objects = [self.model.objects.create(**{**self.data_object, 'img':SimpleUploadedFile(name=f'image_{index}.PNG', content=content, content_type='image/png')}) for index in range(2)]
+        self.assertEqual(model_objects[0].img.name, model_objects[1].img.name)
+        self.assertEqual(MediaFile.objects.get(name=model_objects[0].img.name).references, 2)
+        storage = model_objects[0].img.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            model_objects[0].delete()
+        self.assertTrue(storage.exists(model_objects[1].img.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            model_objects[1].delete()
+        self.assertFalse(storage.exists(model_objects[1].img.name))
+        self.assertFalse(MediaFile.objects.filter(name=model_objects[1].img.name).exists())
+        self.model_object = None
+
+    def test_correct_migrate_media_layout(self):
+        """
+        Test to verify that an image stored with the flat layout is moved to the sharded layout and the old file is removed.
+        """
+        self.model_object = self.model.objects.create(**self.data_object)
+        storage = self.model_object.img.storage
+        legacy_name = FileSystemStorage(location=storage.location).save('media_hotel/legacy_example.png', ContentFile(test_generate_image_content(width=19, height=11)))
+        self.model.objects.filter(id=self.model_object.id).update(img=legacy_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrate_media_layout', batch_size=1, stdout=StringIO())
+        self.model_object.refresh_from_db()
+        digest = os.path.splitext(os.path.basename(self.model_object.img.name))[0]
+        self.assertEqual(self.model_object.img.name, f'media_hotel/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertTrue(storage.exists(self.model_object.img.name))
+        self.assertFalse(storage.exists(legacy_name))
+        self.assertEqual(MediaFile.objects.get(name=self.model_object.img.name).references, 1)
+
+    def test_correct_migrate_media_layout_shard_depth(self):
+        """
+        Test to verify that an image and a variant sharded with another depth are moved under the directories of the model,
+        without keeping the shards of the previous layout.
+        """
+        self.model_object = self.model.objects.create(**self.data_object)
+        storage = self.model_object.img.storage
+        legacy_storage = FileSystemStorage(location=storage.location)
+        content = test_generate_image_content(width=23, height=7)
+        digest = hashlib.sha256(content).hexdigest()
+        legacy_name = legacy_storage.save(f'media_hotel/{digest[:2]}/{digest}.png', ContentFile(content))
+        legacy_variant = legacy_storage.save(f'media_hotel/variants/{digest[:2]}/{digest}.jpg', ContentFile(content))
+        self.model.objects.filter(id=self.model_object.id).update(img=legacy_name, variants={'thumbnail': {'jpeg': legacy_variant}})
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrate_media_layout', batch_size=1, stdout=StringIO())
+        self.model_object.refresh_from_db()
+        self.assertEqual(self.model_object.img.name, f'media_hotel/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(self.model_object.variants['thumbnail']['jpeg'], f'media_hotel/variants/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertTrue(storage.exists(self.model_object.img.name))
+        self.assertFalse(storage.exists(legacy_name))
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=0)
+    def test_incorrect_variants_model(self):
+        """
+        An image that can not be decoded keeps the original without variants.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.model_object = self.model.objects.create(**self.data_object)
+        self.model_object.refresh_from_db()
+        self.assertEqual(self.model_object.status, self.model.ChoicesStatusMedia.failed)
+        self.assertEqual(self.model_object.variants, {})
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=0)
+    def test_correct_exif_stripped_model(self):
+        """
+        Test to verify that the processed image replaces the upload, rotated by its EXIF orientation and without the EXIF data.
+        """
+        image, content, exif = Image.new('RGB', (40, 20), color=(200, 30, 30)), BytesIO(), Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera test'
+        image.save(content, format='JPEG', exif=exif)
+        self.data_object['img'] = SimpleUploadedFile(name='hotel_media_test_example.jpg', content=content.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.model_object = self.model.objects.create(**self.data_object)
+        upload_name = self.model_object.img.name
+        self.model_object.refresh_from_db()
+        self.assertEqual(self.model_object.status, self.model.ChoicesStatusMedia.ready)
+        self.assertNotEqual(self.model_object.img.name, upload_name)
+        self.assertFalse(MediaFile.objects.filter(name=upload_name).exists())
+        with self.model_object.img.open('rb') as file, Image.open(file) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=0)
+    def test_correct_process_pending_media(self):
+        """
+        Test to verify that the images left 'pending', like the ones not queued, are processed by the "process_pending_media" command.
+        """
+        self.data_object['img'] = SimpleUploadedFile(name='hotel_media_test_example.png', content=test_generate_image_content(width=23, height=29), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=False):
+            self.model_object = self.model.objects.create(**self.data_object)
+        self.assertEqual(self.model_object.status, self.model.ChoicesStatusMedia.pending)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_pending_media', batch_size=1, stdout=StringIO())
+        self.model_object.refresh_from_db()
+        self.assertEqual(self.model_object.status, self.model.ChoicesStatusMedia.ready)
+        self.assertEqual(set(self.model_object.variants), {'thumbnail', 'card', 'full'})
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=0, MEDIA_MAX_DIMENSION=100)
+    def test_incorrect_dimension_model(self):
+        """
+        An image larger than MEDIA_MAX_DIMENSION is not decoded and the record is marked as failed.
+        """
+        self.data_object['img'] = SimpleUploadedFile(name='hotel_media_test_example.png', content=test_generate_image_content(width=101, height=10), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.model_object = self.model.objects.create(**self.data_object)
+        self.model_object.refresh_from_db()
+        self.assertEqual(self.model_object.status, self.model.ChoicesStatusMedia.failed)
+        self.assertEqual(self.model_object.variants, {})
+
     def test_correct_update_model(self):
         model_object = self.model.objects.create(**self.data_object)
         self.assertTrue(self.model.objects.filter(id=model_object.id).exists())
@@ -322,6 +490,7 @@ class RoomMediaTestCase(TestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
     
     def setUp(self):
+        test_use_temporary_media_root(self)
         self.model = RoomMedia
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.hotel =  Hotel.objects.create(**test_generate_hotel_data(account=self.account))
@@ -421,6 +590,61 @@ class RoomExtraTestCase(TestCase):
         self.assertEqual(model_object.id_rooms.count(), len(data_object_upt['id_rooms']))  
         self.assertTrue(model_object.id_rooms.filter(id__in=data_object_upt['id_rooms']).exists())  
     
+    def test_correct_add_rooms_num_queries(self):
+        """
+        Test to verify that the rooms are linked with a fixed number of queries, regardless of the number of rooms,
+        including the bitmask of amenities of the rooms, which is read once and written once per distinct bitmask.
+        """
+        Room.objects.bulk_create([Room(**test_generate_room_data(hotel=self.hotel, account=self.account)) for _ in range(400)])
+        id_rooms = list(Room.objects.values_list('id', flat=True))
+        model_object = self.model.objects.create()
+        with self.assertNumQueries(5):
+            Room.add_rooms(self, model_object=model_object, id_rooms=id_rooms)
+        self.assertEqual(model_object.id_rooms.count(), len(id_rooms))
+
+    def test_correct_amenities_model(self):
+        """
+        Test to verify that the bitmask of amenities of the rooms follows the links, flags and deletion of the RoomExtra records.
+        """
+        room = Room.objects.create(**test_generate_room_data(hotel=self.hotel, account=self.account))
+        internet = self.model.create_model(self, **test_generate_room_extra_data(id_rooms=[self.room.id, room.id], has_internet=True))
+        tv = self.model.create_model(self, **test_generate_room_extra_data(id_rooms=[self.room.id], has_tv=True))
+        self.assertEqual(Room.get_amenities(self, Room.objects.get(id=self.room.id).amenities), {'has_internet': True, 'has_tv': True})
+        self.assertEqual(Room.objects.get(id=room.id).amenities, Room.get_amenities_mask(self, has_internet=True))
+        internet.has_tv = True
+        internet.save()
+        self.assertEqual(Room.get_amenities(self, Room.objects.get(id=room.id).amenities), {'has_internet': True, 'has_tv': True})
+        internet.delete_item_room(room)
+        self.assertEqual(Room.objects.get(id=room.id).amenities, 0)
+        internet.delete()
+        self.assertEqual(Room.get_amenities(self, Room.objects.get(id=self.room.id).amenities), {'has_internet': False, 'has_tv': True})
+        tv.id_rooms.clear()
+        self.assertEqual(Room.objects.get(id=self.room.id).amenities, 0)
+
+    def test_correct_amenities_filter(self):
+        """
+        Test to verify that the amenity filters return the same rooms as an IN over the bitmasks or as a bitwise AND.
+        """
+        rooms = [Room.objects.create(**test_generate_room_data(hotel=self.hotel, account=self.account)) for _ in range(3)]
+        self.model.create_model(self, **test_generate_room_extra_data(id_rooms=[rooms[0].id, rooms[1].id], has_internet=True))
+        self.model.create_model(self, **test_generate_room_extra_data(id_rooms=[rooms[1].id, rooms[2].id], has_tv=True))
+        cases = [({'has_internet': True}, {rooms[0].id, rooms[1].id}), ({'has_internet': True, 'has_tv': False}, {rooms[0].id}),
+                 ({'has_internet': False, 'has_tv': False}, {self.room.id})]
+        for max_values in (64, 1):
+            with mock.patch('apps.hotel.models.AMENITY_FILTER_MAX_VALUES', max_values):
+                for amenities, expected in cases:
+                    self.assertEqual(set(Room.get_query_filtered_rooms(self, **amenities).values_list('id', flat=True)), expected)
+
+    def test_incorrect_add_rooms(self):
+        """
+        Test to verify that every missing room is reported at once, and neither the record nor any link is created.
+        """
+        missing = [Room.objects.order_by('-id').first().id + offset for offset in (1, 2)]
+        with self.assertRaises(ValidationError) as error:
+            self.model.create_model(self, **test_generate_room_extra_data(id_rooms=[self.room.id, *missing], has_tv=True))
+        self.assertIn(str(missing), str(error.exception))
+        self.assertFalse(self.model.objects.filter(has_tv=True).exists())
+
     def test_correct_create_or_update_model(self):
         """
         Test to verify the proper functioning of the create_or_update_model method. Additionally, 
@@ -617,6 +841,7 @@ class HotelMediaRegisterTestCase(APITransactionTestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
 
     def setUp(self):
+        test_use_temporary_media_root(self)
         self.model = HotelMedia
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.client.force_authenticate(user=self.account)
@@ -816,6 +1041,59 @@ class RoomRegisterTestCase(APITransactionTestCase):
         self.assertNotEqual(response.status_code, 201)
         self.assertIn('cod', response.data)
 
+    def get_bulk_rooms(self, size):
+        rooms = []
+        for number in range(1, size + 1):
+            room = test_generate_room_data(hotel=self.hotel.id, account=self.account.id)
+            room.pop('id_hotel')
+            room.pop('updated_by')
+            rooms.append({**room, 'name':'Room', 'number':number, 'price':str(room['price'])})
+        return rooms
+
+    def test_correct_bulk_register_view(self):
+        """
+        Test to verify that the rooms are created with a fixed number of queries, regardless of the number of rooms, and are indexed.
+        """
+        rooms = self.get_bulk_rooms(300)
+        rooms[0]['description'] = 'Penthouse with a private terrace'
+        with self.assertNumQueries(9):
+            response = self.client.post(f'{LOCAL_URL}{self.local_urn}bulk/', data={'id_hotel':self.hotel.id, 'rooms':rooms}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['cod'], 0)
+        self.assertEqual(len(response.data['queryset']), len(rooms))
+        self.assertEqual(self.model.objects.filter(id_hotel=self.hotel, updated_by=self.account).count(), len(rooms))
+        self.assertTrue(all(item['id'] is not None for item in response.data['queryset']))
+        response = self.client.get(f'{LOCAL_URL}/hotel/viewer/search/', data={'q':'terrace'})
+        self.assertEqual([item['id'] for item in response.data['queryset']], [self.model.objects.get(id_hotel=self.hotel, number=1).id])
+
+    def test_incorrect_bulk_register_view(self):
+        """
+        Test to verify that no room is created when any room is invalid, and the errors are returned by position in the following cases:
+        #Case 1: A room repeated in the list sent and a room already stored.
+        #Case 2: A room without name and number, and a room with an incorrect room_status.
+        """
+        self.model.objects.create(**{**test_generate_room_data(hotel=self.hotel, account=self.account), 'name':'Room', 'number':3})
+        rooms = self.get_bulk_rooms(5)
+        #Case 1
+        rooms[4]['number'] = 1
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}bulk/', data={'id_hotel':self.hotel.id, 'rooms':rooms}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['cod'], 1)
+        errors = response.data['errors']['rooms']
+        self.assertEqual([index for index, error in enumerate(errors) if error], [2, 4])
+        self.assertEqual(self.model.objects.filter(id_hotel=self.hotel).count(), 1)
+        #Case 2
+        rooms = self.get_bulk_rooms(3)
+        rooms[0]['name'], rooms[0]['number'] = None, None
+        rooms[2]['room_status'] = 'wrong_status'
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}bulk/', data={'id_hotel':self.hotel.id, 'rooms':rooms}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('room_status', response.data['errors']['rooms'][2])
+        self.assertEqual(self.model.objects.filter(id_hotel=self.hotel).count(), 1)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}bulk/', data={'id_hotel':self.hotel.id, 'rooms':rooms[:2]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([index for index, error in enumerate(response.data['errors']['rooms']) if error], [0])
+
     def test_correct_update_view(self):
         response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
         self.assertEqual(response.status_code, 201)
@@ -879,6 +1157,7 @@ class RoomMediaRegisterTestCase(APITransactionTestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
 
     def setUp(self):
+        test_use_temporary_media_root(self)
         self.model = RoomMedia
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.client.force_authenticate(user=self.account)
@@ -1044,6 +1323,22 @@ class RoomExtraRegisterTestCase(APITransactionTestCase):
         self.assertTrue(model_object.id_rooms.filter(id=response.data['id_rooms'][0]['id_room']).exists())
         model_object.delete()
     
+    def test_correct_rooms_lookup_register_view(self):
+        """
+        Test to verify that the rooms are looked up with a single query, and that the missing rooms are reported at once
+        without creating the record.
+        """
+        room_table = Room._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(1, sum(f'SELECT "{room_table}"."id" FROM "{room_table}" WHERE "{room_table}"."id" IN' in query['sql'] for query in queries))
+        missing = [Room.objects.order_by('-id').first().id + offset for offset in (1, 2)]
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={**self.data_object, 'id_rooms':[self.room.id, *missing]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(missing), response.data['message'])
+        self.assertEqual(self.model.objects.count(), 1)
+    
     def test_correct_update_view(self):
         response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
         self.assertEqual(response.status_code, 201)
@@ -1114,6 +1409,8 @@ class HotelPublicViewerTestCase(APITransactionTestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
 
     def setUp(self):
+        test_use_temporary_media_root(self)
+        cache.clear()
         self.model = Hotel
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.client.force_authenticate(user=self.account)
@@ -1139,6 +1436,64 @@ class HotelPublicViewerTestCase(APITransactionTestCase):
         self.assertIn('cod', response.data)
         self.assertEqual(self.hotel.id, response.data['id'])
 
+    def test_correct_cache_view(self):
+        """
+        Test to verify that the responses are served from the cache until the hotel is updated.
+        Only the query of the conditional headers is executed.
+        """
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cod', response.data)
+        self.assertEqual(self.hotel.name, response.data['name'])
+        self.model.update_model(self, model_object=self.hotel, name=fake.name())
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.hotel.name, response.data['name'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'hotel.example.com'])
+    def test_correct_cache_host_view(self):
+        """
+        Test to verify that the cached pages are kept per host, so the "next" link always points to the requested host.
+        """
+        Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'page_size':1})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['next'].startswith('http://testserver/'))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'page_size':1}, HTTP_HOST='hotel.example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['next'].startswith('http://hotel.example.com/'))
+
+    def test_correct_conditional_retrieve_view(self):
+        """
+        Test to verify the conditional requests in the following cases:
+        Case 1: The ETag and Last-Modified headers are sent with the record.
+        Case 2: The record has not changed, 304 is answered with a single query.
+        Case 3: The media of the hotel is deleted, the record is sent again.
+        """
+        #Case 1
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        #Case 2
+        with self.assertNumQueries(1):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        #Case 3
+        self.hotel_media.delete()
+        self.hotel_media = HotelMedia.objects.create(**test_generate_hotel_media_data(hotel=Hotel.objects.create(**test_generate_hotel_data(account=self.account))))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.hotel.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['media'], [])
+
 
 
 
@@ -1160,6 +1515,7 @@ class HotelPrivateViewerTestCase(APITransactionTestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
 
     def setUp(self):
+        test_use_temporary_media_root(self)
         self.model = Hotel
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.client.force_authenticate(user=self.account)
@@ -1184,6 +1540,28 @@ class HotelPrivateViewerTestCase(APITransactionTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('cod', response.data)
         self.assertEqual(self.hotel.id, response.data['id'])
+
+    def test_correct_list_view_num_queries(self):
+        """
+        Test to verify that the hotels, their rooms, the media of both and "updated_by" are loaded with a fixed number of queries,
+        regardless of the number of hotels and rooms.
+        """
+        media = []
+        for _ in range(5):
+            hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+            media.append(HotelMedia.objects.create(**test_generate_hotel_media_data(hotel=hotel)))
+            Room.objects.bulk_create([Room(**test_generate_room_data(hotel=hotel, account=self.account)) for _ in range(20)])
+            media.append(RoomMedia.create_model(self, **test_generate_room_media_data(id_rooms=list(Room.objects.filter(id_hotel=hotel).values_list('id', flat=True)))))
+        HotelMedia.objects.update(status=HotelMedia.ChoicesStatusMedia.ready)
+        RoomMedia.objects.update(status=RoomMedia.ChoicesStatusMedia.ready)
+        with self.assertNumQueries(4):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.model.objects.all().count(), len(response.data['queryset']))
+        self.assertEqual(Room.objects.all().count(), sum(len(item['room']) for item in response.data['queryset']))
+        self.assertTrue(all(len(room['media']) == 1 for item in response.data['queryset'] for room in item['room']))
+        for model_object in media:
+            model_object.delete()
     
     def test_incorrect_permission_request(self):
         """
@@ -1217,6 +1595,8 @@ class RoomPublicViewerTestCase(APITransactionTestCase):
         print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
 
     def setUp(self):
+        test_use_temporary_media_root(self)
+        cache.clear()
         self.model = Room
         self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
         self.client.force_authenticate(user=self.account)
@@ -1240,4 +1620,435 @@ class RoomPublicViewerTestCase(APITransactionTestCase):
         response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.room.id}/')
         self.assertEqual(response.status_code, 200)
         self.assertIn('cod', response.data)
-        self.assertEqual(self.room.id, response.data['id'])
\ No newline at end of file
+        self.assertEqual(self.room.id, response.data['id'])
+        self.assertEqual({'has_internet': False, 'has_tv': False}, response.data['extra'])
+
+    def test_correct_list_view_num_queries(self):
+        """
+        Test to verify that the rooms, their hotel and media are loaded with a fixed number of queries over a large dataset,
+        the extras are read from the bitmask of amenities of the room.
+        """
+        for _ in range(10):
+            hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+            Room.objects.bulk_create([Room(**test_generate_room_data(hotel=hotel, account=self.account)) for _ in range(50)])
+        id_rooms = list(Room.objects.order_by('id').values_list('id', flat=True))
+        room_media = RoomMedia.create_model(self, **test_generate_room_media_data(id_rooms=id_rooms))
+        RoomExtra.create_model(self, **test_generate_room_extra_data(id_rooms=id_rooms[::2], has_internet=True))
+        RoomExtra.create_model(self, **test_generate_room_extra_data(id_rooms=id_rooms[::3], has_tv=True))
+        RoomMedia.objects.update(status=RoomMedia.ChoicesStatusMedia.ready)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'page_size':len(id_rooms)})
+        room_media.delete()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(id_rooms), len(response.data['queryset']))
+        room_hotels = dict(Room.objects.values_list('id', 'id_hotel'))
+        for index, item in enumerate(sorted(response.data['queryset'], key=lambda item: item['id'])):
+            self.assertEqual(item['extra'], {'has_internet': index % 2 == 0, 'has_tv': index % 3 == 0})
+            self.assertEqual(item['id_hotel']['id'], room_hotels[item['id']])
+            self.assertEqual(len(item['media']), 1 if item['id'] != self.room.id else 2)
+
+    def test_correct_sparse_fieldset_list_view(self):
+        """
+        Test to verify that the fields omitted with "?fields=" or "?exclude=" are not returned and their relations are not queried.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'fields':'id,name,price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(set(item) == {'id', 'name', 'price'} for item in response.data['queryset']))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'exclude':'media,id_hotel,updated_by'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all('extra' in item and not {'media', 'id_hotel', 'updated_by'} & set(item) for item in response.data['queryset']))
+
+    def test_correct_filtered_list_view(self):
+        """
+        Test to verify that the list is filtered by the hotel, price range, capacity and extras of the rooms.
+        """
+        hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        rooms = [Room.objects.create(**{**test_generate_room_data(hotel=hotel, account=self.account), 'price':price, 'room_capacity':2}) for price in (40, 90, 150)]
+        room_extra = RoomExtra.create_model(self, **test_generate_room_extra_data(id_rooms=[rooms[0].id, rooms[1].id], has_internet=True))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_hotel':hotel.id, 'price_min':50, 'room_capacity':2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({rooms[1].id, rooms[2].id}, {item['id'] for item in response.data['queryset']})
+
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_hotel':hotel.id, 'has_internet':'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rooms[2].id], [item['id'] for item in response.data['queryset']])
+        room_extra.delete()
+
+    def test_correct_facets_list_view(self):
+        """
+        Test to verify that the facets count the rooms matching the filters per star rating and per price bucket.
+        """
+        hotel = Hotel.objects.create(**{**test_generate_hotel_data(account=self.account), 'stars':4})
+        for price in (40, 90, 95, 2000):
+            Room.objects.create(**{**test_generate_room_data(hotel=hotel, account=self.account), 'price':price})
+        with self.settings(ROOM_PRICE_FACET_BUCKETS=[50, 100]):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_hotel':hotel.id, 'facets':1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['stars'], {0:0, 1:0, 2:0, 3:0, 4:4, 5:0})
+        self.assertEqual([bucket['count'] for bucket in response.data['facets']['price']], [1, 2, 1])
+        self.assertIsNone(response.data['facets']['price'][-1]['max'])
+
+    def test_incorrect_filtered_list_view(self):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'price_min':100, 'price_max':50})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cod', response.data)
+
+    def test_correct_cache_view(self):
+        """
+        Test to verify that the responses are served from the cache until a RoomExtra is linked to the room.
+        """
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cod', response.data)
+        self.assertFalse(response.data['queryset'][0]['extra']['has_tv'])
+        RoomExtra.create_or_update_model(self, **test_generate_room_extra_data(id_rooms=[self.room.id], has_tv=True))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['queryset'][0]['extra']['has_tv'])
+
+    def test_correct_conditional_retrieve_view(self):
+        """
+        Test to verify that a room answers 304 while it has not changed, and the record is sent again once a RoomExtra is linked.
+        """
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.room.id}/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.room.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        RoomExtra.create_or_update_model(self, **test_generate_room_extra_data(id_rooms=[self.room.id], has_internet=True))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{self.room.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(response.data['extra']['has_internet'])
+
+
+
+
+class SearchViewerTestCase(APITransactionTestCase):
+    """
+    It is verified that the full text search over the hotels and rooms is correct and kept up to date.
+    """
+    local_urn = '/hotel/viewer/search/'
+
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+
+    def setUp(self):
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.hotel = Hotel.objects.create(**{**test_generate_hotel_data(account=self.account), 'name':'Azure Palace', 'description':'Hotel in front of the sea.'})
+        self.room = Room.objects.create(**{**test_generate_room_data(hotel=self.hotel, account=self.account), 'name':'Suite', 'description':'Azure walls with sea views.'})
+
+    def test_correct_search_view(self):
+        """
+        Test to verify that the results are ranked, a match in the name is more relevant than a match in the description.
+        """
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'azure'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([('hotel', self.hotel.id), ('room', self.room.id)], [(item['kind'], item['id']) for item in response.data['queryset']])
+        self.assertGreater(response.data['queryset'][0]['rank'], response.data['queryset'][1]['rank'])
+
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'sea vie', 'kind':'room'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([self.room.id], [item['id'] for item in response.data['queryset']])
+        self.assertEqual(self.hotel.id, response.data['queryset'][0]['id_hotel']['id'])
+
+    def test_correct_incremental_update(self):
+        """
+        Test to verify that the index follows the updates and deletions of the records.
+        """
+        Room.update_model(self, model_object=self.room, description='Garden views.')
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'garden'})
+        self.assertEqual([self.room.id], [item['id'] for item in response.data['queryset']])
+        self.room.delete()
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'garden'})
+        self.assertEqual([], response.data['queryset'])
+
+    def test_correct_rebuild_command(self):
+        Room.objects.filter(id=self.room.id).update(description='Mountain views.')
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'mountain'})
+        self.assertEqual([self.room.id], [item['id'] for item in response.data['queryset']])
+
+    def test_correct_rowid_update(self):
+        """
+        Test to verify that every record keeps a single document, replaced by its rowid, and that a hotel and a room with
+        the same ID do not replace each other.
+        """
+        Room.update_model(self, model_object=self.room, description='Garden views.')
+        Room.update_model(self, model_object=self.room, description='Garden views again.')
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid, kind, object_id FROM {SEARCH_TABLE} WHERE (kind = 'hotel' AND object_id = %s) OR (kind = 'room' AND object_id = %s)", [self.hotel.id, self.room.id])
+            documents = cursor.fetchall()
+        self.assertEqual(sorted(documents), sorted([(self.hotel.id * 2, 'hotel', self.hotel.id), (self.room.id * 2 + 1, 'room', self.room.id)]))
+
+    def test_incorrect_unsupported_database_search(self):
+        """
+        Test to verify that the search is refused on the databases without full text search, while the writes of the
+        records keep working without an index.
+        """
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            with self.assertRaises(SearchNotAvailable):
+                get_search_index()
+            Room.update_model(self, model_object=self.room, description='Garden views.')
+            response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'q':'azure'})
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.data['cod'], 1)
+
+    def test_incorrect_search_view(self):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'kind':'room'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cod', response.data)
+
+
+
+
+class MediaServeTestCase(TestCase):
+    """
+    It is verified that the media files are served with validators, byte ranges and the transfer offload.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+
+    def setUp(self):
+        test_use_temporary_media_root(self)
+        self.storage = HotelMedia._meta.get_field('img').storage
+        self.content = test_generate_image_content(width=23, height=7)
+        self.name = self.storage.save('media_hotel/serve_example.png', ContentFile(self.content))
+        self.url = f'/media/{self.name}'
+        account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.hotel = Hotel.objects.create(**test_generate_hotel_data(account=account))
+        #The records are inserted without "save", so the image is not processed.
+        HotelMedia.objects.bulk_create([HotelMedia(id_hotel=self.hotel, img=self.name, status=HotelMedia.ChoicesStatusMedia.ready)])
+
+    def tearDown(self):
+        self.storage.delete(self.name)
+
+    def test_correct_serve_view(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_correct_range_serve_view(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='accel')
+    def test_correct_offload_serve_view(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_incorrect_serve_view(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(self.client.get('/media/../hotelsolution/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/media_hotel/missing.png').status_code, 404)
+
+    def test_incorrect_unprocessed_serve_view(self):
+        """
+        Test to verify that the raw uploads, of a 'pending' or 'failed' record or of no record, are not served.
+        """
+        for status in (HotelMedia.ChoicesStatusMedia.pending, HotelMedia.ChoicesStatusMedia.failed):
+            HotelMedia.objects.filter(img=self.name).update(status=status)
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+        name = self.storage.save('media_hotel/raw_example.png', ContentFile(test_generate_image_content(width=5, height=5)))
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 404)
+        self.assertEqual(self.client.get(f'/media/media_room/../{name}').status_code, 404)
+
+
+
+
+
+class MediaGarbageCollectorTestCase(TestCase):
+    """
+    It is verified that the media files not used by any record are reported and removed by the "collect_orphan_media" command.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=os.path.join(self.directory.name, 'media'), UPLOAD_TEMP_DIR=os.path.join(self.directory.name, 'uploads'),
+                                                   MEDIA_PROCESSING_WORKERS=0)
+        self.settings_override.enable()
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def create_media(self, hotel, width, height):
+        with self.captureOnCommitCallbacks(execute=True):
+            model_object = HotelMedia.objects.create(id_hotel=hotel, img=SimpleUploadedFile(name='hotel_media_test_example.png', content=test_generate_image_content(width=width, height=height), content_type='image/png'))
+        model_object.refresh_from_db()
+        return model_object, [model_object.img.name, *(name for formats in model_object.variants.values() for name in formats.values())]
+
+    def test_correct_collect_orphan_media(self):
+        """
+        Test to verify that the files of the media deleted in cascade with their hotel and the partial files without a pending upload
+        are reported, ignored while they are recent and removed with "--delete", while the files in use are kept.
+        """
+        storage = HotelMedia._meta.get_field('img').storage
+        kept_object, kept_names = self.create_media(self.hotel, 31, 17)
+        hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        orphan_object, orphan_names = self.create_media(hotel, 37, 13)
+        hotel.delete()
+        os.makedirs(settings.UPLOAD_TEMP_DIR)
+        partial_path = os.path.join(settings.UPLOAD_TEMP_DIR, f'{uuid.uuid4()}.part')
+        with open(partial_path, 'wb') as file:
+            file.write(b'partial')
+
+        output = StringIO()
+        call_command('collect_orphan_media', min_age=0, stdout=output)
+        self.assertTrue(all(name in output.getvalue() for name in orphan_names))
+        self.assertFalse(any(name in output.getvalue() for name in kept_names))
+        self.assertTrue(all(storage.exists(name) for name in orphan_names))
+        output = StringIO()
+        call_command('collect_orphan_media', min_age=60*60, stdout=output)
+        self.assertNotIn(orphan_object.img.name, output.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('collect_orphan_media', delete=True, min_age=0, batch_size=2, stdout=StringIO())
+        self.assertFalse(any(storage.exists(name) for name in orphan_names))
+        self.assertFalse(MediaFile.objects.filter(name=orphan_object.img.name).exists())
+        self.assertFalse(os.path.exists(partial_path))
+        self.assertTrue(all(storage.exists(name) for name in kept_names))
+        self.assertTrue(MediaFile.objects.filter(name=kept_object.img.name).exists())
+
+    def test_correct_repair_references(self):
+        """
+        Test to verify that the media deleted in cascade release their references, and that the command reports and
+        corrects the counts that do not match the records.
+        """
+        content = test_generate_image_content(width=19, height=11)
+        hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        for id_hotel in (self.hotel, hotel):
+            HotelMedia.objects.create(id_hotel=id_hotel, img=SimpleUploadedFile(name='hotel_media_test_example.png', content=content, content_type='image/png'))
+        name = HotelMedia.objects.get(id_hotel=self.hotel).img.name
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        hotel.delete()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+        MediaFile.objects.filter(name=name).update(references=5)
+        output = StringIO()
+        call_command('collect_orphan_media', min_age=60*60, stdout=output)
+        self.assertIn(f'{name}: 5 references counted, 1 records.', output.getvalue())
+        self.assertEqual(MediaFile.objects.get(name=name).references, 5)
+        call_command('collect_orphan_media', delete=True, min_age=60*60, stdout=StringIO())
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+
+
+
+class MediaUploadTestCase(APITransactionTestCase):
+    """
+    It is verified that the resumable uploads in chunks create the media records.
+    """
+    local_urn = '/hotel/register/upload/'
+
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+
+    def setUp(self):
+        test_use_temporary_media_root(self)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(UPLOAD_TEMP_DIR=self.temp_dir.name)
+        self.settings_override.enable()
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.client.force_authenticate(user=self.account)
+        self.hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        self.content = test_generate_image_content(width=41, height=29)
+        self.data_object = {'kind':'hotel', 'id_hotel':self.hotel.id, 'filename':'upload_example.png', 'size':len(self.content), 'checksum':hashlib.sha256(self.content).hexdigest()}
+
+    def tearDown(self):
+        for model_object in HotelMedia.objects.all():
+            model_object.delete()
+        self.settings_override.disable()
+        self.temp_dir.cleanup()
+
+    def send_chunk(self, id, offset, content):
+        return self.client.put(f'{LOCAL_URL}{self.local_urn}{id}/chunk/?offset={offset}', data=content, content_type='application/octet-stream')
+
+    def test_correct_upload_view(self):
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object, format='json')
+        self.assertEqual(response.status_code, 201)
+        id, half = response.data['id'], len(self.content) // 2
+        self.assertEqual(self.send_chunk(id, 0, self.content[:half]).status_code, 200)
+
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}{id}/')
+        self.assertEqual(response.data['received'], half)
+        response = self.send_chunk(id, 0, self.content[half:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received'], half)
+        self.assertEqual(self.send_chunk(id, half, self.content[half:]).status_code, 200)
+
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}{id}/complete/')
+        self.assertEqual(response.status_code, 201)
+        media_object = HotelMedia.objects.get(id=response.data['upload']['media_id'])
+        with media_object.img.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_incorrect_upload_view(self):
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={**self.data_object, 'checksum':'0' * 64}, format='json')
+        self.assertEqual(response.status_code, 201)
+        id = response.data['id']
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}{id}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.send_chunk(id, 0, self.content)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}{id}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(HotelMedia.objects.exists())
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={**self.data_object, 'kind':'room'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -2,7 +2,7 @@ from django.urls import path, include
 
 from rest_framework import routers
 
-from .views import HotelRegisterView, HotelMediaRegisterView, RoomRegisterView, RoomMediaRegisterView, RoomExtraRegisterView, HotelPublicViewer, HotelPrivateViewer, RoomPublicViewer
+from .views import HotelRegisterView, HotelMediaRegisterView, RoomRegisterView, RoomMediaRegisterView, RoomExtraRegisterView, HotelPublicViewer, HotelPrivateViewer, RoomPublicViewer, SearchViewer, MediaUploadView
 
 router = routers.DefaultRouter()
 router.register('register/hotel', HotelRegisterView, basename='register_hotel')
@@ -10,9 +10,11 @@ router.register('register/hotelmedia', HotelMediaRegisterView, basename='registe
 router.register('register/room', RoomRegisterView, basename='register_room')
 router.register('register/roommedia', RoomMediaRegisterView, basename='register_room_media')
 router.register('register/roomextra', RoomExtraRegisterView, basename='register_room_media')
+router.register('register/upload', MediaUploadView, basename='register_upload')
 router.register('viewer/hotel', HotelPublicViewer, basename='viewer_hotel')
 router.register('viewer/private/hotel', HotelPrivateViewer, basename='viewer_private_hotel')
 router.register('viewer/room', RoomPublicViewer, basename='viewer_room')
+router.register('viewer/search', SearchViewer, basename='viewer_search')
 
 router.register
 
@@ -1,14 +1,25 @@
-from django.utils.translation import gettext_lazy as _
+import hashlib
+
+from django.conf import settings
+
+from django.utils.translation import gettext_lazy as _, get_language
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
 from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 from rest_framework import permissions, status, viewsets, parsers
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from apps.hotel.models import Hotel, HotelMedia, Room, RoomMedia, RoomExtra
-from apps.hotel.serializer import HotelRegisterSerializer, HotelMediaRegisterSerializer, RoomRegisterSerializer, RoomMediaRegisterSerializer, RoomDeleteItemSerializer, RoomExtraRegisterSerializer, HotelSimplifyViewerSerializer, HotelCompleteViewerSerializer, RoomViewerSerializer
+from hotelsolution.streaming import is_stream_requested, stream_list_response
+
+from apps.hotel.cache import ViewerCache
+from apps.hotel.models import Hotel, HotelMedia, Room, RoomMedia, RoomExtra, MediaUpload
+from apps.hotel.search import SearchNotAvailable, get_search_index
+from apps.hotel.serializer import HotelRegisterSerializer, HotelMediaRegisterSerializer, RoomRegisterSerializer, RoomBulkRegisterSerializer, RoomMediaRegisterSerializer, RoomDeleteItemSerializer, RoomExtraRegisterSerializer, HotelSimplifyViewerSerializer, HotelCompleteViewerSerializer, RoomViewerSerializer, RoomFilterSerializer, SearchQuerySerializer, HotelSearchResultSerializer, RoomSearchResultSerializer, MediaUploadSerializer
 
 # Create your views here.
 
@@ -24,13 +35,25 @@ class BaseCRUDModelView(viewsets.ModelViewSet):
     http_method_names = None
 
     def get_queryset(self):
+        """
+        The serializer can declare a "setup_eager_loading" method to load its relations in bulk.
+        """
         if getattr(self, 'swagger_fake_view', False):
             return None
-        return self.model.objects.all()
+        queryset = self.model.objects.all()
+        serializer = self.get_serializer()
+        if hasattr(serializer, 'setup_eager_loading'):
+            queryset = serializer.setup_eager_loading(queryset)
+        return queryset
     
     def list(self, request, *args, **kwargs):
+        """
+        With "?stream=1" all the records are written incrementally instead of paginated.
+        """
         try:
             queryset = self.filter_queryset(self.get_queryset())
+            if is_stream_requested(request):
+                return stream_list_response(queryset, self.get_serializer)
 
             page = self.paginate_queryset(queryset)
             if page is not None:
@@ -133,6 +156,23 @@ class RoomRegisterView(BaseCRUDModelView):
         except Exception as e:
             return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create the rooms of a hotel at once, nothing is created when any room is invalid.
+        """
+        serializer = RoomBulkRegisterSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'cod':1,'message':_('Data error.'), 'errors':serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            model_objects = serializer.save(updated_by=request.user)
+        except ValidationError as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.serializer_class(model_objects, many=True)
+        return Response({'cod':0,'message': f'{len(model_objects)} {self.model.__name__} records created successfully.', 'queryset':serializer.data}, status=status.HTTP_201_CREATED)
+
 
 
 
@@ -205,34 +245,177 @@ class RoomExtraRegisterView(BaseCRUDModelView):
 
 
 
+class MediaUploadView(viewsets.GenericViewSet):
+    """
+    Resumable upload of HotelMedia and RoomMedia images in chunks. To utilize the various methods, the user must have administrator privileges.
+    1. POST with "kind", "id_hotel" or "id_rooms", "filename", "size" and the SHA-256 "checksum" of the file starts the upload.
+    2. PUT ".../{id}/chunk/?offset=N" with the raw bytes of the chunk, N is the number of bytes received so far.
+    3. GET ".../{id}/" returns the bytes received, to resume an interrupted upload from there.
+    4. POST ".../{id}/complete/" verifies the checksum and creates the media record.
+    """
+    model = MediaUpload
+    serializer_class = MediaUploadSerializer
+    permission_classes = [permissions.IsAdminUser]
+    http_method_names = ['get', 'post', 'put', 'delete']
+    media_serializer_classes = {MediaUpload.ChoicesKindUpload.hotel: HotelMediaRegisterSerializer, MediaUpload.ChoicesKindUpload.room: RoomMediaRegisterSerializer}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return self.model.objects.all()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'cod':1,'message':f"{_('Data error: ')} {serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(updated_by=request.user)
+        return Response({'cod':0, **serializer.data}, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        model_object = get_object_or_404(self.model, pk=pk)
+        return Response({'cod':0, **self.get_serializer(model_object).data}, status=status.HTTP_200_OK)
+
+    def destroy(self, request, pk=None, *args, **kwargs):
+        model_object = get_object_or_404(self.model, pk=pk)
+        model_object.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None, *args, **kwargs):
+        """
+        The body is read from the request stream in blocks and appended to the partial file, it is never parsed nor buffered.
+        """
+        model_object = get_object_or_404(self.model, pk=pk)
+        try:
+            offset = int(request.query_params.get('offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'cod':1,'message':_('The "offset" parameter and the "Content-Length" header must be integers.')}, status=status.HTTP_400_BAD_REQUEST)
+        if length < 1 or length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response({'cod':1,'message':_('The size of the chunk must be between 1 and %(max)s bytes.') % {'max': settings.UPLOAD_CHUNK_MAX_SIZE}}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            model_object = self.model.write_chunk(self, model_object=model_object, offset=offset, stream=request.stream, length=length)
+        except ValidationError as e:
+            model_object.refresh_from_db()
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}", 'received':model_object.received}, status=status.HTTP_409_CONFLICT)
+        return Response({'cod':0, **self.get_serializer(model_object).data}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None, *args, **kwargs):
+        model_object = get_object_or_404(self.model, pk=pk)
+        try:
+            media_object = self.model.complete(self, model_object=model_object)
+        except ValidationError as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.media_serializer_classes[model_object.kind](media_object)
+        return Response({'cod':0,'message': f'{media_object.__class__.__name__} created successfully.', 'upload':self.get_serializer(model_object).data, **serializer.data}, status=status.HTTP_201_CREATED)
+
+
+
+
 class BaseViewer(viewsets.ReadOnlyModelViewSet):
     """
     Basic viewer to display the content of records either by their ID or as a list of all records
+    The successful responses are cached when a "cache_namespace" is declared.
+    The records retrieved by their ID answer conditional requests when the "updated_at" lookups of the record and its relations are declared in "conditional_fields".
     """
     model = None
     serializer_class = None
     queryset = None
     http_method_names = ['get']
+    cache_namespace = None
+    conditional_fields = None
 
     def get_queryset(self):
+        """
+        The serializer can declare a "setup_eager_loading" method to load its relations in bulk.
+        """
         if getattr(self, 'swagger_fake_view', False):
             return None
-        return self.model.objects.all()
+        queryset = self.model.objects.all()
+        serializer = self.get_serializer()
+        if hasattr(serializer, 'setup_eager_loading'):
+            queryset = serializer.setup_eager_loading(queryset)
+        return queryset
+    
+    def get_cached_response(self, request):
+        if self.cache_namespace is None:
+            return None
+        data = ViewerCache(self.cache_namespace).get(request)
+        if data is None:
+            return None
+        return Response(data, status=status.HTTP_200_OK)
+
+    def set_cached_response(self, request, response):
+        if self.cache_namespace is not None and response.status_code == status.HTTP_200_OK:
+            ViewerCache(self.cache_namespace).set(request, response.data)
+        return response
     
     def list(self, request, *args, **kwargs):
+        """
+        With "?stream=1" all the records are written incrementally instead of paginated, these responses are not cached.
+        """
+        if is_stream_requested(request):
+            return stream_list_response(self.filter_queryset(self.get_queryset()), self.get_serializer)
+        cached_response = self.get_cached_response(request)
+        if cached_response is not None:
+            return cached_response
         try:
             queryset = self.filter_queryset(self.get_queryset())
 
             page = self.paginate_queryset(queryset)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
+                return self.set_cached_response(request, self.get_paginated_response(serializer.data))
 
             serializer = self.get_serializer(queryset, many=True)
-            return Response({'cod':0, 'queryset':serializer.data}, status = status.HTTP_200_OK)
+            return self.set_cached_response(request, Response({'cod':0, 'queryset':serializer.data}, status = status.HTTP_200_OK))
         except Exception as e:
             return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_conditional_validators(self, request, pk):
+        """
+        Compute the ETag and Last-Modified timestamp of a record with a single aggregate query over the "updated_at" fields of the record and its relations.
+        The number of related records is included in the ETag, so removing a relation also changes it.
+        """
+        aggregates = {}
+        for index, field in enumerate(self.conditional_fields):
+            aggregates[f'updated_at_{index}'] = Max(field)
+            if '__' in field:
+                aggregates[f'count_{index}'] = Count(field.rsplit('__', 1)[0], distinct=True)
+        try:
+            values = self.model.objects.filter(pk=pk).aggregate(**aggregates)
+        except (TypeError, ValueError):
+            return None
+        if values['updated_at_0'] is None:
+            return None
+
+        last_modified = max(value for key, value in values.items() if key.startswith('updated_at_') and value is not None)
+        validator = f"{sorted(values.items())}{get_language()}{request.get_full_path()}"
+        return quote_etag(hashlib.sha256(validator.encode()).hexdigest()), int(last_modified.timestamp())
+
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        headers = {}
+        validators = None if self.conditional_fields is None else self.get_conditional_validators(request, pk)
+        if validators is not None:
+            etag, last_modified = validators
+            headers = {'ETag': etag, 'Last-Modified': http_date(last_modified)}
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                for header, value in headers.items():
+                    not_modified[header] = value
+                return not_modified
+
+        response = self.get_cached_response(request)
+        if response is None:
+            response = self.set_cached_response(request, super().retrieve(request, pk=pk, *args, **kwargs))
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
 
 
     
@@ -244,6 +427,8 @@ class HotelPublicViewer(BaseViewer):
     serializer_class = HotelSimplifyViewerSerializer
     queryset = None
     http_method_names = ['get']
+    cache_namespace = 'hotel'
+    conditional_fields = ['updated_at', 'hotel_media_reference__updated_at']
 
 
 
@@ -265,8 +450,73 @@ class HotelPrivateViewer(BaseViewer):
 class RoomPublicViewer(BaseViewer):
     """
     Retrieve all data for a room, room_media and room_extra, records.
+    The list can be filtered with the fields of RoomFilterSerializer, and with "?facets=1" it also returns the number of rooms
+    per star rating and per price bucket that match the filters.
     """
     model = Room
     serializer_class = RoomViewerSerializer
     queryset = None
-    http_method_names = ['get']
\ No newline at end of file
+    http_method_names = ['get']
+    cache_namespace = 'room'
+    conditional_fields = ['updated_at', 'id_hotel__updated_at', 'room_media_reference__updated_at']
+    room_filters = {}
+
+    def list(self, request, *args, **kwargs):
+        filter_serializer = RoomFilterSerializer(data=request.query_params)
+        if not filter_serializer.is_valid():
+            return Response({'cod':1,'message':f"{_('Data error: ')} {filter_serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
+        self.room_filters = filter_serializer.validated_data
+        return super().list(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        self.filtered_queryset = self.model.get_query_filtered_rooms(self, queryset=queryset, **self.room_filters)
+        return self.filtered_queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get('facets', '').lower() in ('1', 'true'):
+            response.data['facets'] = self.model.get_facets(self, queryset=self.filtered_queryset)
+        return response
+
+
+
+
+class SearchViewer(viewsets.GenericViewSet):
+    """
+    Full text search over the name and description of the hotels and rooms, the results are ordered by relevance.
+    Parameters: "q", the text to search, "kind", to only search 'hotel' or 'room' records, and "limit".
+    """
+    serializer_class = HotelSearchResultSerializer
+    queryset = None
+    http_method_names = ['get']
+    result_serializer_classes = {'hotel': HotelSearchResultSerializer, 'room': RoomSearchResultSerializer}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return Hotel.objects.none()
+
+    def get_result_objects(self, hits):
+        """
+        Load the records of the results with one query per kind.
+        """
+        querysets = {'hotel': Hotel.objects.all(), 'room': Room.objects.select_related('id_hotel')}
+        return {kind: queryset.in_bulk([object_id for hit_kind, object_id, rank in hits if hit_kind == kind]) for kind, queryset in querysets.items()}
+
+    def list(self, request, *args, **kwargs):
+        search_serializer = SearchQuerySerializer(data=request.query_params)
+        if not search_serializer.is_valid():
+            return Response({'cod':1,'message':f"{_('Data error: ')} {search_serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            hits = get_search_index().search(search_serializer.validated_data['q'], kind=search_serializer.validated_data['kind'], limit=search_serializer.validated_data['limit'])
+            objects = self.get_result_objects(hits)
+            results = []
+            for kind, object_id, rank in hits:
+                if object_id in objects[kind]:
+                    serializer = self.result_serializer_classes[kind](objects[kind][object_id], context=self.get_serializer_context())
+                    results.append({'kind':kind, 'rank':rank, **serializer.data})
+            return Response({'cod':0, 'queryset':results}, status = status.HTTP_200_OK)
+        except SearchNotAvailable as e:
+            return Response({'cod':1,'message':f"{_('Search not available.')} {str(e)}"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,118 @@
+import calendar, time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.reservation.models import RoomNight
+
+
+def iterate_months(start : date, months):
+    year, month = start.year, start.month
+    for index in range(months):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def get_month_end(year, month):
+    return date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+
+
+def get_month_days(year, month):
+    return calendar.monthrange(year, month)[1]
+
+
+def encode_runs(bitmap):
+    """
+    Runs of the occupied nights of a month bitmap, like [[first_day, nights], ...] with the days starting at 1.
+    """
+    runs, day = [], 1
+    while bitmap:
+        #The trailing zeros are free nights and the trailing ones are a run of occupied nights.
+        free = (bitmap & -bitmap).bit_length() - 1
+        bitmap >>= free
+        day += free
+        occupied = (bitmap ^ (bitmap + 1)).bit_length() - 1
+        runs.append([day, occupied])
+        bitmap >>= occupied
+        day += occupied
+    return runs
+
+
+class RoomCalendarCache:
+    """
+    Cache of the occupied nights of every room and month, as a bitmap with the bit "day - 1" set for every night reserved.
+    Every room keeps a version number in the cache backend, and the change of a reservation increments the version of its
+    room, so the months of the other rooms are kept. The versions and the months of many rooms are read with "get_many".
+    """
+    def __init__(self, timeout=None):
+        self.timeout = settings.ROOM_CALENDAR_CACHE_TIMEOUT if timeout is None else timeout
+
+    def get_version_key(self, id_room):
+        return f'calendar:room:{id_room}:version'
+
+    def get_key(self, id_room, version, year, month):
+        return f'calendar:room:{id_room}:{version}:{year}-{month:02d}'
+
+    def get_versions(self, id_rooms):
+        keys = {self.get_version_key(id_room): id_room for id_room in id_rooms}
+        versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+        for id_room in set(id_rooms) - versions.keys():
+            #A time based version avoids reusing the number of a version key evicted by the backend.
+            cache.add(self.get_version_key(id_room), time.time_ns(), None)
+            versions[id_room] = cache.get(self.get_version_key(id_room))
+        return versions
+
+    def get_many(self, versions, months):
+        """
+        Bitmaps of the months of every room, like {id_room: {(year, month): bitmap}}, only with the months found in the cache.
+        """
+        keys = {self.get_key(id_room, version, year, month): (id_room, (year, month)) for id_room, version in versions.items() for year, month in months}
+        bitmaps = {}
+        for key, bitmap in cache.get_many(list(keys)).items():
+            id_room, month = keys[key]
+            bitmaps.setdefault(id_room, {})[month] = bitmap
+        return bitmaps
+
+    def set_many(self, versions, bitmaps):
+        cache.set_many({self.get_key(id_room, versions[id_room], year, month): bitmap
+                        for id_room, months in bitmaps.items() for (year, month), bitmap in months.items()}, self.timeout)
+
+    def invalidate(self, id_room):
+        try:
+            cache.incr(self.get_version_key(id_room))
+        except ValueError:
+            cache.add(self.get_version_key(id_room), time.time_ns(), None)
+
+
+def invalidate_room_calendars(*id_rooms):
+    """
+    Invalidate the calendars of the rooms once the current transaction commits, or immediately outside a transaction.
+    """
+    def invalidate():
+        calendar_cache = RoomCalendarCache()
+        for id_room in set(id_rooms):
+            calendar_cache.invalidate(id_room)
+    transaction.on_commit(invalidate)
+
+
+def get_room_calendars(id_rooms, start : date, months):
+    """
+    Occupied nights of every room for the months from the one of "start", like {id_room: {(year, month): bitmap}}.
+    The months missing in the cache are computed for their rooms with a single range query over the RoomNight ledger,
+    which only holds the nights of the reservations not canceled.
+    """
+    months = list(iterate_months(start, months))
+    calendar_cache = RoomCalendarCache()
+    versions = calendar_cache.get_versions(id_rooms)
+    bitmaps = calendar_cache.get_many(versions, months)
+    missing = [id_room for id_room in id_rooms if len(bitmaps.get(id_room, {})) < len(months)]
+    if missing:
+        computed = {id_room: {month: 0 for month in months} for id_room in missing}
+        nights = RoomNight.objects.filter(id_room__in=missing, night__gte=date(*months[0], 1), night__lt=get_month_end(*months[-1]))
+        for id_room, night in nights.values_list('id_room', 'night').iterator():
+            computed[id_room][(night.year, night.month)] |= 1 << (night.day - 1)
+        calendar_cache.set_many(versions, computed)
+        bitmaps.update(computed)
+    return {id_room: {month: bitmaps[id_room][month] for month in months} for id_room in id_rooms}
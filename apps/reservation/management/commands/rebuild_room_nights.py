@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hotelsolution.streaming import iterate_queryset_chunks
+
+from apps.reservation.availability import invalidate_room_calendars
+from apps.reservation.models import Reservation, RoomNight
+
+
+class Command(BaseCommand):
+    """
+    Generate again the RoomNight ledger from the reservations, for example after the deploy of the ledger or after loading
+    reservations without "Reservation.save_without_overlap". The reservations are processed in batches ordered by ID, every
+    batch replaces the nights of its reservations in a transaction. The nights already held by another reservation are not
+    inserted, those overlapping reservations are reported to be solved by hand.
+    """
+    help = 'Generate again the nights reserved of the rooms from the reservations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Remove every night of the ledger before the rebuild.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            invalidate_room_calendars(*RoomNight.objects.values_list('id_room', flat=True).distinct())
+            RoomNight.objects.all().delete()
+        queryset = Reservation.objects.only('id', 'id_room', 'check_in', 'check_out', 'has_canceled')
+        total = conflicts = 0
+        for batch in iterate_queryset_chunks(queryset, options['batch_size']):
+            nights = [RoomNight(id_room_id=model_object.id_room_id, id_reservation=model_object, night=night)
+                      for model_object in batch if not model_object.has_canceled
+                      for night in RoomNight.get_nights(self, check_in=model_object.check_in, check_out=model_object.check_out)]
+            with transaction.atomic():
+                RoomNight.objects.filter(id_reservation__in=batch).delete()
+                RoomNight.objects.bulk_create(nights, ignore_conflicts=True)
+                inserted = RoomNight.objects.filter(id_reservation__in=batch).count()
+                invalidate_room_calendars(*{model_object.id_room_id for model_object in batch})
+            total += len(batch)
+            if inserted != len(nights):
+                conflicts += len(nights) - inserted
+                held = set(RoomNight.objects.filter(id_reservation__in=batch).values_list('id_reservation', 'night'))
+                for pk in sorted({night.id_reservation.pk for night in nights if (night.id_reservation.pk, night.night) not in held}):
+                    self.stdout.write(self.style.WARNING(f'The reservation {pk} overlaps another reservation of its room.'))
+        self.stdout.write(self.style.SUCCESS(f'{total} reservations processed, {conflicts} nights in conflict.'))
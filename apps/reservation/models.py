@@ -1,14 +1,24 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS, IntegrityError
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
 
 from apps.account.models import Account
 from apps.hotel.models import Room
 
 
+class OverlappingReservation(ValidationError):
+    """
+    The room already has an active reservation whose stay overlaps the requested one.
+    """
+    pass
+
+
 class Discount(models.Model):
     discount_code = models.CharField(verbose_name=_('Code Discount'), max_length=100, unique=True, blank=False)
     discount_rate = models.DecimalField(verbose_name=_('Discount rate %'), validators=[MaxValueValidator(100)], max_digits=5, decimal_places=2, default=0)
@@ -21,6 +31,7 @@ class Discount(models.Model):
     class Meta:
         verbose_name = _('Discount')
         verbose_name_plural = _('Discounts')
+        indexes = [models.Index(fields=['created_at', 'id'], name='discount_created_at_idx')]
 
     def __str__(self):
         return f'{self.discount_code}'
@@ -66,6 +77,7 @@ class Reservation(models.Model):
     class Meta:
         verbose_name = _('Reservation')
         verbose_name_plural = _('Reservations')
+        indexes = [models.Index(fields=['created_at', 'id'], name='reservation_created_at_idx')]
 
     def __str__(self):
         return f'R{self.id_room}-I{self.check_in}-O{self.check_out}'
@@ -80,7 +92,7 @@ class Reservation(models.Model):
         model_object.full_clean()
         model_object.price = Reservation.calculated_price(self, check_in=extra_fields.get('check_in'), check_out=extra_fields.get('check_out'), id_room=extra_fields.get('id_room'), id_discount=None if not 'id_discount' in extra_fields.keys() else extra_fields.get('id_discount'))
         
-        model_object.save()
+        Reservation.save_without_overlap(self, model_object=model_object)
         return model_object
     
     def update_model(self, model_object=None, **extra_fields):
@@ -90,7 +102,45 @@ class Reservation(models.Model):
         for field, value in extra_fields.items():
             setattr(model_object, field, value)
 
-        model_object.save()
+        Reservation.save_without_overlap(self, model_object=model_object)
+        return model_object
+
+    def lock_room(self, id_room, using=DEFAULT_DB_ALIAS):
+        """
+        Lock the room until the end of the transaction, so the reservations of a room are checked and saved one at a time
+        while the reservations of other rooms go on. SQLite has no row locks, a write on the room takes the write lock of the
+        database at the start of the transaction instead of at the insert, so a check can not be overtaken by another writer.
+        """
+        rooms = Room.objects.using(using).filter(pk=id_room.pk)
+        if connections[using].features.has_select_for_update:
+            list(rooms.select_for_update().values_list('pk', flat=True))
+        else:
+            rooms.update(id=models.F('id'))
+
+    def save_without_overlap(self, model_object=None, using=DEFAULT_DB_ALIAS):
+        """
+        Save the reservation unless it is active and another active reservation already holds one of its nights in the room.
+        The check, the save and the nights of the RoomNight ledger are written in a transaction holding the lock of the room.
+        """
+        if model_object is None or not isinstance(model_object, Reservation):
+            raise ValidationError(message=_('The object can`t be updated.'))
+        try:
+            with transaction.atomic(using=using):
+                nights = []
+                if not model_object.has_canceled:
+                    Reservation.lock_room(self, id_room=model_object.id_room, using=using)
+                    nights = RoomNight.get_nights(self, check_in=model_object.check_in, check_out=model_object.check_out)
+                    reserved = RoomNight.objects.using(using).filter(id_room=model_object.id_room, night__in=nights)
+                    if model_object.pk is not None:
+                        reserved = reserved.exclude(id_reservation=model_object.pk)
+                    if reserved.exists():
+                        raise OverlappingReservation(message=_('The room is already reserved between the "check_in" and "check_out" dates.'))
+                model_object.save(using=using)
+                RoomNight.replace_nights(self, model_object=model_object, nights=nights, using=using)
+        except IntegrityError as e:
+            if RoomNight.UNIQUE_CONSTRAINT in str(e) or RoomNight._meta.db_table in str(e):
+                raise OverlappingReservation(message=_('The room is already reserved between the "check_in" and "check_out" dates.'))
+            raise
         return model_object
     
     def save(self, *args, **kwargs):
@@ -103,8 +153,12 @@ class Reservation(models.Model):
         if id_discount is not None and not isinstance(id_discount, Discount):
             raise ValidationError(message=_('The price cannot be calculated with the input Discount object'))
 
-        days = check_out - check_in
-        price = id_room.price * days.days
+        return Reservation.get_discounted_price(self, price=RoomRate.get_stay_price(self, id_room=id_room, check_in=check_in, check_out=check_out), id_discount=id_discount)
+
+    def get_discounted_price(self, price, id_discount=None):
+        """
+        Apply the discount to the price of the stay, the fixed "discount" takes precedence over the "discount_rate".
+        """
         if id_discount:
             if id_discount.discount:
                 price -= id_discount.discount
@@ -116,15 +170,220 @@ class Reservation(models.Model):
                 raise ValidationError(message=_('The discount could not be applied.'))
         return price
 
+    def calculated_prices(self, quotes):
+        """
+        Price a batch of (id_room, check_in, check_out, id_discount) quotes with the rules of "calculated_price", the rooms
+        and the discounts can be objects or IDs. The rooms and the discounts given by ID are loaded with a query each, the
+        rates of every room over the nights of all the quotes with another one, and every distinct stay and every distinct
+        combination of stay price and discount is computed once. The prices keep the order of the quotes.
+        """
+        quotes = list(quotes)
+        rooms = {id_room.pk: id_room for id_room, check_in, check_out, id_discount in quotes if isinstance(id_room, Room)}
+        discounts = {id_discount.pk: id_discount for id_room, check_in, check_out, id_discount in quotes if isinstance(id_discount, Discount)}
+        id_rooms = {id_room for id_room, check_in, check_out, id_discount in quotes if not isinstance(id_room, Room)} - rooms.keys()
+        id_discounts = {id_discount for id_room, check_in, check_out, id_discount in quotes if id_discount is not None and not isinstance(id_discount, Discount)} - discounts.keys()
+        if id_rooms:
+            rooms.update(Room.objects.only('id', 'price').in_bulk(id_rooms))
+            missing = id_rooms - rooms.keys()
+            if missing:
+                raise ValidationError(message=_('The rooms %(missing)s do not exist.') % {'missing': sorted(missing)})
+        if id_discounts:
+            discounts.update(Discount.objects.only('id', 'discount', 'discount_rate').in_bulk(id_discounts))
+            missing = id_discounts - discounts.keys()
+            if missing:
+                raise ValidationError(message=_('The discounts %(missing)s do not exist.') % {'missing': sorted(missing)})
+
+        stays = [RoomRate.get_night_dates(self, check_in=check_in, check_out=check_out) for id_room, check_in, check_out, id_discount in quotes]
+        nights = [night for stay in stays for night in stay[:1] + stay[-1:]]
+        tables = RoomRate.get_rate_tables(self, id_rooms=list(rooms), first_night=min(nights), last_night=max(nights)) if nights else {}
+
+        prices, stay_prices, computed = [], {}, {}
+        for (id_room, check_in, check_out, id_discount), stay in zip(quotes, stays):
+            room = rooms[getattr(id_room, 'pk', id_room)]
+            discount = None if id_discount is None else discounts[getattr(id_discount, 'pk', id_discount)]
+            stay_key = (room.pk, stay[0] if stay else None, len(stay))
+            if stay_key not in stay_prices:
+                stay_prices[stay_key] = RoomRate.get_table_price(self, price=room.price, table=tables.get(room.pk, {}), nights=stay)
+            key = (stay_prices[stay_key], None if discount is None else discount.pk)
+            if key not in computed:
+                computed[key] = Reservation.get_discounted_price(self, price=key[0], id_discount=discount)
+            prices.append(computed[key])
+        return prices
+
     def canceled_reservation(self, model_object=None):
         if model_object is None or not isinstance(model_object, Reservation):
             raise ValidationError(message=_('The object can`t be updated.'))
         
-        model_object.has_canceled = False
+        model_object.has_canceled = True
+        return Reservation.save_without_overlap(self, model_object=model_object)
+
+    def get_query_available_rooms(self, check_in : datetime, check_out : datetime, guest=1, id_hotel=None, room_status=None):
+        """
+        Query to retrieve the rooms with enough capacity and without any night reserved between "check_in" and "check_out",
+        checked in the RoomNight ledger with a lookup over its (room, night) index.
+        Discontinued rooms are excluded unless a "room_status" is requested.
+        """
+        if check_in >= check_out:
+            raise ValidationError(message=_('The date in the "check_out" field cannot be less than or equal to the date in the "check_in" field'))
+        overlapping = RoomNight.objects.filter(id_room=OuterRef('pk'), night__in=RoomNight.get_nights(self, check_in=check_in, check_out=check_out))
+        queryset = Room.objects.filter(room_capacity__gte=guest)
+        if id_hotel is not None:
+            queryset = queryset.filter(id_hotel=id_hotel)
+        if room_status is not None:
+            queryset = queryset.filter(room_status=room_status)
+        else:
+            queryset = queryset.exclude(room_status=Room.ChoicesStatusRoom.discontinued)
+        return queryset.filter(~Exists(overlapping)).select_related('id_hotel').order_by('id_hotel', 'id')
+
+
+
+
+class RoomNight(models.Model):
+    """
+    Inventory ledger with a record per night reserved of every room, written with the reservation by "Reservation.save_without_overlap".
+    The nights of a stay go from the date of the check in to the day before the date of the check out, a stay within a single
+    date holds that night. The unique constraint keeps a night of a room in a single active reservation.
+    """
+    UNIQUE_CONSTRAINT = 'unique_room_night'
+
+    id_room = models.ForeignKey(Room, related_name='room_night_reference', on_delete=models.CASCADE)
+    id_reservation = models.ForeignKey(Reservation, related_name='reservation_night_reference', on_delete=models.CASCADE)
+    night = models.DateField(verbose_name=_('Night'))
+
+
+    class Meta:
+        verbose_name = _('Room Night')
+        verbose_name_plural = _('Room Nights')
+        constraints = [models.UniqueConstraint(fields=['id_room', 'night'], name='unique_room_night')]
+        indexes = [models.Index(fields=['night', 'id_room'], name='room_night_night_idx'),
+                   models.Index(fields=['id_reservation'], name='room_night_reservation_idx')]
+
+    def __str__(self):
+        return f'R{self.id_room_id}-N{self.night}'
+
+    def get_date(self, value):
+        if isinstance(value, datetime):
+            return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+        return value
+
+    def get_nights(self, check_in, check_out):
+        first_night, last_day = RoomNight.get_date(self, check_in), RoomNight.get_date(self, check_out)
+        return [first_night + timedelta(days=day) for day in range(max((last_day - first_night).days, 1))]
+
+    def replace_nights(self, model_object=None, nights=None, using=DEFAULT_DB_ALIAS):
+        """
+        Replace the nights of the reservation in the ledger, a canceled reservation holds no night.
+        """
+        if model_object is None or not isinstance(model_object, Reservation):
+            raise ValidationError(message=_('The object can`t be updated.'))
+        RoomNight.objects.using(using).filter(id_reservation=model_object).delete()
+        RoomNight.objects.using(using).bulk_create([RoomNight(id_room=model_object.id_room, id_reservation=model_object, night=night) for night in nights or []])
+
+    def get_occupancy(self, start : date, end : date, id_hotel=None):
+        """
+        Number of rooms reserved per night between "start" and "end", excluded, counted over the night index of the ledger.
+        """
+        queryset = RoomNight.objects.filter(night__gte=start, night__lt=end)
+        if id_hotel is not None:
+            queryset = queryset.filter(id_room__id_hotel=id_hotel)
+        return dict(queryset.values_list('night').annotate(rooms=Count('id')).order_by('night'))
+
+
+
+
+class RoomRate(models.Model):
+    """
+    Nightly price of a room between "start_date" and "end_date", both included, replacing "Room.price" on those nights.
+    "weekdays" limits the rate to some days of the week, with a bit per day from Monday (1) to Sunday (64), like 96 for
+    the nights of Saturday and Sunday, and 0 for every day. When several rates cover a night, the one with the highest
+    "priority" applies, and the most recent one between equal priorities, so a per-date override is a rate of a single
+    day with a priority greater than the one of the season.
+    """
+    WEEKDAYS_ALL = 127
+
+    id_room = models.ForeignKey(Room, related_name='room_rate_reference', on_delete=models.CASCADE)
+    name = models.CharField(verbose_name=_('Name'), max_length=100, blank=False)
+    start_date = models.DateField(verbose_name=_('Start date'))
+    end_date = models.DateField(verbose_name=_('End date'))
+    weekdays = models.PositiveSmallIntegerField(verbose_name=_('Days of the week'), validators=[MaxValueValidator(WEEKDAYS_ALL)], default=0)
+    price = models.DecimalField(verbose_name=_('Price per night'), unique=False, max_digits=6, decimal_places=2, default=0)
+    priority = models.PositiveSmallIntegerField(verbose_name=_('Priority'), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    updated_by = models.ForeignKey(Account, related_name='update_by_room_rate_reference', null=True, blank=False, on_delete=models.SET_NULL)
+
+
+    class Meta:
+        verbose_name = _('Room Rate')
+        verbose_name_plural = _('Room Rates')
+        indexes = [models.Index(fields=['id_room', 'start_date', 'end_date'], name='room_rate_dates_idx')]
+
+    def __str__(self):
+        return f'{self.name}'
+
+    def clean_fields(self, exclude=None):
+        if self.start_date > self.end_date:
+            raise ValidationError(message=_('The date in the "end_date" field cannot be less than the date in the "start_date" field'))
+        return super().clean_fields(exclude)
+
+    def update_model(self, model_object=None, **extra_fields):
+        if model_object is None or not isinstance(model_object, RoomRate):
+            raise ValidationError(message=_('The object can`t be updated.'))
+
+        for field, value in extra_fields.items():
+            setattr(model_object, field, value)
+
         model_object.save()
         return model_object
 
-    
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+    def get_night_dates(self, check_in, check_out):
+        """
+        Nights charged for a stay, one per day between "check_in" and "check_out" like the days counted by "calculated_price".
+        """
+        first_night = RoomNight.get_date(self, check_in)
+        return [first_night + timedelta(days=day) for day in range((check_out - check_in).days)]
+
+    def get_rate_tables(self, id_rooms, first_night : date, last_night : date):
+        """
+        Price of the nights covered by a rate between "first_night" and "last_night", like {id_room: {night: price}}, loaded
+        with a single range query over the index of the rates. The rates are applied by ascending priority, so the greatest one
+        of every night is kept. The nights without a rate are not in the tables, they keep the price of the room.
+        """
+        tables = {getattr(id_room, 'pk', id_room): {} for id_room in id_rooms}
+        rates = RoomRate.objects.filter(id_room__in=list(tables), start_date__lte=last_night, end_date__gte=first_night)
+        for rate in rates.only('id', 'id_room', 'start_date', 'end_date', 'weekdays', 'price', 'priority').order_by('priority', 'id'):
+            table = tables[rate.id_room_id]
+            night, end_night = max(rate.start_date, first_night), min(rate.end_date, last_night)
+            while night <= end_night:
+                if not rate.weekdays or rate.weekdays & (1 << night.weekday()):
+                    table[night] = rate.price
+                night += timedelta(days=1)
+        return tables
 
+    def get_table_price(self, price, table, nights):
+        return sum((table.get(night, price) for night in nights), Decimal(0))
+
+    def get_stay_price(self, id_room=None, check_in=None, check_out=None):
+        """
+        Price of the nights of the stay before the discounts, with the rates of the room loaded in a single query.
+        """
+        if id_room is None or not isinstance(id_room, Room):
+            raise ValidationError(message=_('The price cannot be calculated with the input Room object'))
+        nights = RoomRate.get_night_dates(self, check_in=check_in, check_out=check_out)
+        if not nights:
+            return Decimal(0)
+        table = RoomRate.get_rate_tables(self, id_rooms=[id_room], first_night=nights[0], last_night=nights[-1])[id_room.pk]
+        return RoomRate.get_table_price(self, price=id_room.price, table=table, nights=nights)
 
+    def get_stay_prices(self, id_rooms, check_in, check_out):
+        """
+        Price of the same stay in every room, like {id_room: price}, with the rates of all the rooms loaded in a single query.
+        """
+        nights = RoomRate.get_night_dates(self, check_in=check_in, check_out=check_out)
+        tables = RoomRate.get_rate_tables(self, id_rooms=id_rooms, first_night=nights[0], last_night=nights[-1]) if nights else {}
+        return {id_room.pk: RoomRate.get_table_price(self, price=id_room.price, table=tables.get(id_room.pk, {}), nights=nights) for id_room in id_rooms}
 
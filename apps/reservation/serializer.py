@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from apps.reservation.models import Discount, Reservation, Room, Account
+from hotelsolution.serializer import SparseFieldsetMixin
+from apps.reservation.models import Discount, Reservation, RoomRate, Room, Account
+from apps.hotel.models import Hotel
 
-class DiscountRegisterSerializer(serializers.ModelSerializer):
+class DiscountRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the Discount model.
     """
@@ -13,21 +16,62 @@ class DiscountRegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Discount
         fields = ['id', 'discount_code', 'discount_rate', 'discount', 'updated_by']
+
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('updated_by'):
+            queryset = queryset.select_related('updated_by')
+        return queryset
     
     def update(self, model_object, validated_data):
         return self.Meta.model.update_model(self, model_object=model_object, **validated_data)
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
         return representation
     
 
 
 
-class ReservationRegisterSerializer(serializers.ModelSerializer):
+class RoomRateRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Serializer for registering new records in the RoomRate model.
+    """
+    id_room = serializers.SlugRelatedField(queryset=Room.objects.all(), slug_field='id')
+    updated_by = serializers.SlugRelatedField(queryset=Account.objects.all(), slug_field='id')
+
+
+    class Meta:
+        model = RoomRate
+        fields = ['id', 'id_room', 'name', 'start_date', 'end_date', 'weekdays', 'price', 'priority', 'updated_by']
+
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('updated_by'):
+            queryset = queryset.select_related('updated_by')
+        return queryset
+
+    def update(self, model_object, validated_data):
+        return self.Meta.model.update_model(self, model_object=model_object, **validated_data)
+
+    def to_representation(self, instance):
+        representation =  super().to_representation(instance)
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
+        return representation
+
+
+
+
+class ReservationRegisterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for registering new records in the Reservation model.
     """
@@ -41,6 +85,11 @@ class ReservationRegisterSerializer(serializers.ModelSerializer):
         model = Reservation
         fields = ['id', 'id_room', 'id_account', 'id_discount', 'guest', 'price', 'check_in', 'check_out', 'has_canceled', 'updated_by']
 
+    def setup_eager_loading(self, queryset):
+        if self.is_field_requested('updated_by'):
+            queryset = queryset.select_related('updated_by')
+        return queryset
+
     def create(self, validated_data):
         return self.Meta.model.create_model(self, **validated_data)
     
@@ -49,7 +98,110 @@ class ReservationRegisterSerializer(serializers.ModelSerializer):
     
     def to_representation(self, instance):
         representation =  super().to_representation(instance)
-        representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
-        representation['created_at'] = instance.created_at
-        representation['updated_at'] = instance.updated_at
-        return representation
\ No newline at end of file
+        if self.is_field_requested('updated_by'):
+            representation['updated_by'] = {'id': instance.updated_by.id, 'email':instance.updated_by.email, 'full_name':instance.updated_by.full_name}
+        if self.is_field_requested('created_at'):
+            representation['created_at'] = instance.created_at
+        if self.is_field_requested('updated_at'):
+            representation['updated_at'] = instance.updated_at
+        return representation
+    
+
+
+
+class RoomAvailabilitySearchSerializer(serializers.Serializer):
+    """
+    Serializer to validate the parameters of a room availability search.
+    """
+    check_in = serializers.DateTimeField()
+    check_out = serializers.DateTimeField()
+    guest = serializers.IntegerField(min_value=1, default=1)
+    id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id', required=False)
+    room_status = serializers.ChoiceField(choices=Room.ChoicesStatusRoom.choices, required=False)
+
+    def validate(self, attrs):
+        if attrs['check_in'] >= attrs['check_out']:
+            raise serializers.ValidationError(_('The date in the "check_out" field cannot be less than or equal to the date in the "check_in" field'))
+        return attrs
+
+
+
+
+class RoomCalendarSearchSerializer(serializers.Serializer):
+    """
+    Serializer to validate the parameters of the calendar of a room or of every room of a hotel.
+    """
+    id_room = serializers.SlugRelatedField(queryset=Room.objects.all(), slug_field='id', required=False)
+    id_hotel = serializers.SlugRelatedField(queryset=Hotel.objects.all(), slug_field='id', required=False)
+    start = serializers.DateField(required=False)
+    months = serializers.IntegerField(min_value=1, default=12)
+    encoding = serializers.ChoiceField(choices=['bitmap', 'runs'], default='bitmap')
+
+    def validate_months(self, months):
+        if months > settings.ROOM_CALENDAR_MAX_MONTHS:
+            raise serializers.ValidationError(_('A maximum of %(months)s months can be requested at once.') % {'months': settings.ROOM_CALENDAR_MAX_MONTHS})
+        return months
+
+    def validate(self, attrs):
+        if ('id_room' in attrs) == ('id_hotel' in attrs):
+            raise serializers.ValidationError(_('The "id_room" field or the "id_hotel" field is required, but not both.'))
+        return attrs
+
+
+
+
+class RoomAvailableSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Serializer for Room model display in the availability search, "stay_price" is the price of the searched stay with the
+    rates of the room, given in the "stay_prices" of the context.
+    """
+    stay_price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Room
+        fields = ['id', 'id_hotel', 'name', 'description', 'number', 'room_status', 'price', 'stay_price', 'room_capacity', 'num_bed']
+
+    def get_stay_price(self, instance):
+        stay_price = self.context.get('stay_prices', {}).get(instance.id)
+        return None if stay_price is None else serializers.DecimalField(max_digits=12, decimal_places=2).to_representation(stay_price)
+
+    def to_representation(self, instance):
+        representation =  super().to_representation(instance)
+        if self.is_field_requested('id_hotel'):
+            representation['id_hotel'] = {'id': instance.id_hotel.id, 'name': instance.id_hotel.name, 'stars': instance.id_hotel.stars}
+        return representation
+
+
+
+
+class ReservationQuoteItemSerializer(serializers.Serializer):
+    """
+    Serializer for every quote of the batch, the rooms are checked by "Reservation.calculated_prices" and the discount codes
+    by the viewer, with a query each instead of a query per quote. The discounts are given by the code the customer holds,
+    not by their ID, so the public quotes can not be used to go over the discounts.
+    """
+    id_room = serializers.IntegerField()
+    check_in = serializers.DateTimeField()
+    check_out = serializers.DateTimeField()
+    discount_code = serializers.CharField(max_length=100, required=False, allow_null=True, default=None)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    def validate(self, attrs):
+        if attrs['check_in'] >= attrs['check_out']:
+            raise serializers.ValidationError(_('The date in the "check_out" field cannot be less than or equal to the date in the "check_in" field'))
+        return attrs
+
+
+
+
+class ReservationQuoteSerializer(serializers.Serializer):
+    """
+    Serializer to validate a batch of quotes, the errors of the quotes are returned by position.
+    """
+    quotes = ReservationQuoteItemSerializer(many=True, allow_empty=False)
+
+    def validate_quotes(self, quotes):
+        if len(quotes) > settings.QUOTE_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(_('A maximum of %(size)s quotes can be priced at once.') % {'size': settings.QUOTE_BATCH_MAX_SIZE})
+        return quotes
+
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.reservation.availability import invalidate_room_calendars
+from apps.reservation.models import Reservation
+
+
+@receiver(post_init, sender=Reservation)
+def remember_reservation_room(sender, instance, **kwargs):
+    """
+    The room loaded with the reservation, a reservation moved to another room also changes the calendar of the previous one.
+    """
+    instance._loaded_id_room = instance.id_room_id
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def invalidate_reservation_calendar(sender, instance, **kwargs):
+    invalidate_room_calendars(*filter(None, {instance.id_room_id, instance._loaded_id_room}))
+    instance._loaded_id_room = instance.id_room_id
@@ -1,15 +1,20 @@
-import time
-from datetime import timedelta
+import time, json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
 from faker import Faker
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from rest_framework.test import APITransactionTestCase
 
 from apps.hotel.models import Hotel, Room
 from apps.hotel.tests import test_generate_hotel_data, test_generate_room_data
 from apps.account.models import Account
 from apps.account.tests import test_generate_account_data
-from apps.reservation.models import Reservation, Discount
+from apps.reservation.models import Reservation, Discount, OverlappingReservation, RoomNight, RoomRate
 
 # Create your tests here.
 fake = Faker()
@@ -175,6 +180,127 @@ class ReservationTestCase(TestCase):
         model_object.delete()
         self.assertFalse(self.model.objects.filter(id=model_object.id).exists())
 
+    def test_correct_adjacent_create_model(self):
+        """
+        Test to verify that a room can be reserved from the check out day of another reservation, and over a canceled reservation.
+        """
+        model_object = self.model.create_model(self, **self.data_object)
+        data_object = {**self.data_object, 'check_in':self.data_object['check_out'], 'check_out':self.data_object['check_out'] + timedelta(days=2)}
+        self.assertTrue(self.model.objects.filter(id=self.model.create_model(self, **data_object).id).exists())
+        self.model.update_model(self, model_object=model_object, has_canceled=True)
+        self.assertTrue(self.model.objects.filter(id=self.model.create_model(self, **self.data_object).id).exists())
+
+    def test_incorrect_overlapping_model(self):
+        """
+        Test to verify that a reservation overlapping an active reservation of the same room is rejected, when it is created
+        and when another reservation is moved over it, while the reservation can be updated with its own dates.
+        """
+        model_object = self.model.create_model(self, **self.data_object)
+        data_object = {**self.data_object, 'check_in':self.data_object['check_in'] - timedelta(days=1), 'check_out':self.data_object['check_in'] + timedelta(days=1)}
+        with self.assertRaises(OverlappingReservation):
+            self.model.create_model(self, **data_object)
+        self.assertEqual(self.model.objects.filter(id_room=self.data_object['id_room']).count(), 1)
+        other_object = self.model.create_model(self, **{**data_object, 'check_out':self.data_object['check_in']})
+        with self.assertRaises(OverlappingReservation):
+            self.model.update_model(self, model_object=other_object, check_out=model_object.check_out)
+        self.model.update_model(self, model_object=model_object, guest=2)
+        self.assertEqual(self.model.objects.get(id=model_object.id).guest, 2)
+
+    def test_correct_night_overlap_model(self):
+        """
+        Test to verify that the overlaps are decided by the nights of the stays: a check in on the day of the check out of
+        another stay, before its time, is accepted, and two stays within the same day hold the same night.
+        """
+        day = datetime.combine(self.data_object['check_in'], datetime.min.time(), tzinfo=timezone.utc)
+        data_object = {**self.data_object, 'check_in':day + timedelta(hours=14), 'check_out':day + timedelta(days=2, hours=11)}
+        self.model.create_model(self, **data_object)
+        self.model.create_model(self, **{**data_object, 'check_in':day + timedelta(days=2, hours=10), 'check_out':day + timedelta(days=4)})
+        data_object = {**data_object, 'check_in':day + timedelta(days=10, hours=8), 'check_out':day + timedelta(days=10, hours=10)}
+        self.model.create_model(self, **data_object)
+        with self.assertRaises(OverlappingReservation):
+            self.model.create_model(self, **{**data_object, 'check_in':day + timedelta(days=10, hours=12), 'check_out':day + timedelta(days=10, hours=14)})
+
+    def test_correct_room_nights_model(self):
+        """
+        Test to verify that the RoomNight ledger holds a night per day of the stay, is replaced when the dates change,
+        is emptied when the reservation is canceled with "canceled_reservation" and is removed with the reservation.
+        """
+        model_object = self.model.create_model(self, **self.data_object)
+        nights = [self.data_object['check_in'] + timedelta(days=day) for day in range((self.data_object['check_out'] - self.data_object['check_in']).days)]
+        self.assertEqual(list(RoomNight.objects.filter(id_reservation=model_object).order_by('night').values_list('night', flat=True)), nights)
+        self.model.update_model(self, model_object=model_object, check_out=model_object.check_out + timedelta(days=2))
+        self.assertEqual(RoomNight.objects.filter(id_reservation=model_object).count(), len(nights) + 2)
+        self.assertEqual(RoomNight().get_occupancy(start=nights[0], end=nights[0] + timedelta(days=1)), {nights[0]: 1})
+        model_object = self.model.canceled_reservation(self, model_object=model_object)
+        self.assertTrue(self.model.objects.get(id=model_object.id).has_canceled)
+        self.assertFalse(RoomNight.objects.filter(id_reservation=model_object).exists())
+        other_object = self.model.create_model(self, **self.data_object)
+        self.assertEqual(RoomNight.objects.filter(id_reservation=other_object).count(), len(nights))
+        other_object.delete()
+        self.assertFalse(RoomNight.objects.exists())
+
+    def test_correct_calculated_prices_model(self):
+        """
+        Test to verify that the batch prices are the ones of "calculated_price" for every rule of the discounts,
+        with a query for the rooms, a query for the discounts and a query for the rates.
+        """
+        room = self.data_object['id_room']
+        other_room = test_generate_new_room(id_account=self.account)
+        discounts = [None,
+                     Discount.objects.create(**test_generate_discount_data(discount_rate=15, discount=0, id_updated_by=self.account)),
+                     Discount.objects.create(**test_generate_discount_data(discount_rate=0, discount=room.price, id_updated_by=self.account)),
+                     Discount.objects.create(**test_generate_discount_data(discount_rate=0, discount=room.price * 100, id_updated_by=self.account))]
+        check_in = self.data_object['check_in']
+        quotes = [(id_room, check_in, check_in + timedelta(days=nights), id_discount) for id_room in (room, other_room) for nights in (1, 3, 7) for id_discount in discounts]
+        expected = [self.model.calculated_price(self, check_in=check_in, check_out=check_out, id_room=id_room, id_discount=id_discount) for id_room, check_in, check_out, id_discount in quotes]
+        with self.assertNumQueries(3):
+            prices = self.model.calculated_prices(self, quotes=[(id_room.id, check_in, check_out, getattr(id_discount, 'id', None)) for id_room, check_in, check_out, id_discount in quotes])
+        self.assertEqual(prices, expected)
+        with self.assertRaises(ValidationError):
+            self.model.calculated_prices(self, quotes=[(0, check_in, check_in + timedelta(days=1), None)])
+
+    def test_correct_room_rate_model(self):
+        """
+        Test to verify the price of a stay of 14 nights with a season, a weekend rate inside the season and an override of a
+        single night, priced with a single query by "calculated_price" and with the same result by "calculated_prices".
+        """
+        room = self.data_object['id_room']
+        check_in = self.data_object['check_in']
+        nights = [check_in + timedelta(days=day) for day in range(14)]
+        RoomRate.objects.create(id_room=room, name='Season', start_date=nights[2], end_date=nights[11], price=room.price + 10, priority=1, updated_by=self.account)
+        RoomRate.objects.create(id_room=room, name='Weekend', start_date=nights[0], end_date=nights[-1], weekdays=96, price=room.price + 20, priority=2, updated_by=self.account)
+        RoomRate.objects.create(id_room=room, name='Override', start_date=nights[5], end_date=nights[5], price=room.price + 30, priority=3, updated_by=self.account)
+        RoomRate.objects.create(id_room=room, name='Future', start_date=nights[-1] + timedelta(days=1), end_date=nights[-1] + timedelta(days=9), price=1, updated_by=self.account)
+        expected = room.price * 14
+        for index, night in enumerate(nights):
+            if index == 5:
+                expected += 30
+            elif night.weekday() >= 5:
+                expected += 20
+            elif 2 <= index <= 11:
+                expected += 10
+        with self.assertNumQueries(1):
+            price = self.model.calculated_price(self, check_in=check_in, check_out=check_in + timedelta(days=14), id_room=room)
+        self.assertEqual(price, expected)
+        self.assertEqual(self.model.calculated_prices(self, quotes=[(room.id, check_in, check_in + timedelta(days=14), None)]), [expected])
+        with self.assertRaises(ValidationError):
+            RoomRate.objects.create(id_room=room, name='Invalid', start_date=nights[1], end_date=nights[0], price=1, updated_by=self.account)
+
+    def test_correct_rebuild_room_nights_command(self):
+        """
+        Test to verify that the command generates the nights of the active reservations and reports the overlapping ones.
+        """
+        model_object = self.model.create_model(self, **self.data_object)
+        canceled_object = self.model.create_model(self, **{**self.data_object, 'check_in':self.data_object['check_out'], 'check_out':self.data_object['check_out'] + timedelta(days=1)})
+        self.model.objects.filter(id=canceled_object.id).update(has_canceled=True)
+        overlapping_object = self.model.objects.create(**self.data_object)
+        RoomNight.objects.all().delete()
+        output = StringIO()
+        call_command('rebuild_room_nights', batch_size=1, stdout=output)
+        self.assertEqual(RoomNight.objects.filter(id_reservation=model_object).count(), (model_object.check_out - model_object.check_in).days)
+        self.assertFalse(RoomNight.objects.exclude(id_reservation=model_object).exists())
+        self.assertIn(f'The reservation {overlapping_object.id} overlaps', output.getvalue())
+
 
 
 
@@ -260,6 +386,32 @@ class ReservationRegisterTestCase(APITransactionTestCase):
         self.assertEqual(model_object.check_out.date(), self.data_object['check_out'])
         self.assertEqual(model_object.has_canceled, self.data_object['has_canceled'])
     
+    def test_incorrect_overlapping_register_view(self):
+        """
+        Test to verify that a second reservation of the same room and dates is rejected with a conflict.
+        """
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['cod'], 1)
+        self.assertEqual(self.model.objects.filter(id_room=self.id_room).count(), 1)
+
+    def test_incorrect_overlapping_partial_update_view(self):
+        """
+        Test to verify that moving a reservation over the dates of another reservation of the room is rejected with a conflict.
+        """
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
+        self.assertEqual(response.status_code, 201)
+        check_out = self.data_object['check_out'] + timedelta(days=3)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={**self.data_object, 'check_in':self.data_object['check_out'], 'check_out':check_out})
+        self.assertEqual(response.status_code, 201)
+        id_reservation = response.data['id']
+        response = self.client.patch(f'{LOCAL_URL}{self.local_urn}{id_reservation}/', data={'check_in':self.data_object['check_in']})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['cod'], 1)
+        self.assertEqual(self.model.objects.get(id=id_reservation).check_in.date(), self.data_object['check_out'])
+
     def test_correct_update_view(self):
         response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data=self.data_object)
         self.assertEqual(response.status_code, 201)
@@ -302,6 +454,45 @@ class ReservationRegisterTestCase(APITransactionTestCase):
         self.assertIn('cod', response.data)
         self.assertFalse(self.model.objects.filter(id=current_id).exists())
 
+    def test_correct_paginated_list_view(self):
+        """
+        Test to verify that following the "next" links returns every record once, ordered by creation.
+        """
+        check_in = fake.date_this_year(before_today=False, after_today=False)
+        for index in range(5):
+            self.model.create_model(self, **test_generate_reservation_data(id_room=self.id_room, id_account=self.account, id_updated_by=self.account,
+                                                                           check_in=check_in + timedelta(days=index * 5), check_out=check_in + timedelta(days=index * 5 + 3)))
+        url, reservations = f'{LOCAL_URL}{self.local_urn}?page_size=2', []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('cod', response.data)
+            self.assertLessEqual(len(response.data['queryset']), 2)
+            reservations += [item['id'] for item in response.data['queryset']]
+            url = response.data['next']
+        self.assertEqual(reservations, list(self.model.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_incorrect_paginated_list_view(self):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'cursor':'wrong_cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cod', response.data)
+
+    @override_settings(STREAMING_CHUNK_SIZE=2)
+    def test_correct_stream_list_view(self):
+        """
+        Test to verify that the streamed list contains every record, written in several chunks.
+        """
+        check_in = fake.date_this_year(before_today=False, after_today=False)
+        for index in range(5):
+            self.model.create_model(self, **test_generate_reservation_data(id_room=self.id_room, id_account=self.account, id_updated_by=self.account,
+                                                                           check_in=check_in + timedelta(days=index * 5), check_out=check_in + timedelta(days=index * 5 + 3)))
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'stream':1, 'page_size':2})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['cod'], 0)
+        self.assertEqual([item['id'] for item in data['queryset']], list(self.model.objects.order_by('id').values_list('id', flat=True)))
+
 
 
 
@@ -402,4 +593,195 @@ class DiscountRegisterTestCase(APITransactionTestCase):
         response = self.client.delete(f'{LOCAL_URL}{self.local_urn}{current_id}/')
         self.assertEqual(response.status_code, 204)
         self.assertIn('cod', response.data)
-        self.assertFalse(self.model.objects.filter(id=current_id).exists())
\ No newline at end of file
+        self.assertFalse(self.model.objects.filter(id=current_id).exists())
+
+
+
+class RoomAvailabilityViewerTestCase(APITransactionTestCase):
+    """
+    It is verified that RoomAvailabilityViewer returns only the free rooms for the requested period.
+    """
+    local_urn = '/reservation/viewer/availability/'
+
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+    
+    def setUp(self):
+        self.model = Reservation
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        self.room_reserved = test_generate_new_room(id_account=self.account, id_hotel=self.hotel)
+        self.room_free = test_generate_new_room(id_account=self.account, id_hotel=self.hotel)
+        self.room_discontinued = test_generate_new_room(id_account=self.account, id_hotel=self.hotel, room_status=Room.ChoicesStatusRoom.discontinued)
+        Room.objects.filter(id_hotel=self.hotel).update(room_capacity=2)
+        self.check_in = fake.date_this_year(before_today=False, after_today=False)
+        self.check_out = self.check_in + timedelta(days=3)
+        self.model.create_model(self, **test_generate_reservation_data(id_room=self.room_reserved, id_account=self.account, id_updated_by=self.account, check_in=self.check_in, check_out=self.check_out))
+        self.model.create_model(self, **test_generate_reservation_data(id_room=self.room_free, id_account=self.account, id_updated_by=self.account, check_in=self.check_in, check_out=self.check_out, has_canceled=True))
+    
+    def get_rooms(self, **params):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_hotel':self.hotel.id, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cod', response.data)
+        return [item['id'] for item in response.data['queryset']]
+
+    def test_correct_list_view(self):
+        """
+        Test to verify the rooms returned in the following cases:
+        Case 1: Overlapping period, the reserved room and the discontinued room are excluded.
+        Case 2: Period ending on the check in day, no reservation overlaps.
+        Case 3: More guests than the capacity of the rooms.
+        Case 4: Explicit room status.
+        """
+        #Case 1
+        rooms = self.get_rooms(check_in=self.check_in + timedelta(days=1), check_out=self.check_out + timedelta(days=1), guest=2)
+        self.assertEqual(rooms, [self.room_free.id])
+        #Case 2
+        rooms = self.get_rooms(check_in=self.check_in - timedelta(days=2), check_out=self.check_in)
+        self.assertEqual(rooms, [self.room_reserved.id, self.room_free.id])
+        #Case 3
+        rooms = self.get_rooms(check_in=self.check_in, check_out=self.check_out, guest=3)
+        self.assertEqual(rooms, [])
+        #Case 4
+        rooms = self.get_rooms(check_in=self.check_in, check_out=self.check_out, room_status=Room.ChoicesStatusRoom.discontinued)
+        self.assertEqual(rooms, [self.room_discontinued.id])
+
+    def test_correct_stay_price_list_view(self):
+        RoomRate.objects.create(id_room=self.room_free, name='Season', start_date=self.check_out, end_date=self.check_out + timedelta(days=1), price=self.room_free.price + 5, updated_by=self.account)
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_hotel':self.hotel.id, 'check_in':self.check_out, 'check_out':self.check_out + timedelta(days=3)})
+        self.assertEqual(response.status_code, 200)
+        stay_prices = {item['id']: Decimal(item['stay_price']) for item in response.data['queryset']}
+        self.assertEqual(stay_prices[self.room_free.id], self.room_free.price * 3 + 10)
+        self.assertEqual(stay_prices[self.room_reserved.id], self.room_reserved.price * 3)
+
+    def test_incorrect_list_view(self):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'check_in':self.check_out, 'check_out':self.check_in})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cod', response.data)
+
+
+
+
+class RoomCalendarViewerTestCase(APITransactionTestCase):
+    """
+    It is verified that RoomCalendarViewer returns the reserved nights of every month, and that the cached months of a
+    room are refreshed when its reservations change.
+    """
+    local_urn = '/reservation/viewer/calendar/'
+
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+    
+    def setUp(self):
+        cache.clear()
+        self.model = Reservation
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.hotel = Hotel.objects.create(**test_generate_hotel_data(account=self.account))
+        self.room = test_generate_new_room(id_account=self.account, id_hotel=self.hotel)
+        self.other_room = test_generate_new_room(id_account=self.account, id_hotel=self.hotel)
+        self.start = date(fake.date_this_year().year + 1, 1, 1)
+        #Nights of January 3, 4 and 5, and of January 30 to February 1.
+        self.reservation = self.model.create_model(self, **test_generate_reservation_data(id_room=self.room, id_account=self.account, id_updated_by=self.account, check_in=self.start + timedelta(days=2), check_out=self.start + timedelta(days=5)))
+        self.model.create_model(self, **test_generate_reservation_data(id_room=self.room, id_account=self.account, id_updated_by=self.account, check_in=self.start + timedelta(days=29), check_out=self.start + timedelta(days=32)))
+
+    def get_months(self, **params):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'start':self.start, 'months':2, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cod'], 0)
+        return {item['id_room']: [month['reserved'] for month in item['months']] for item in response.data['queryset']}
+
+    def test_correct_list_view(self):
+        """
+        Test to verify the calendar in the following cases:
+        Case 1: Bitmaps and runs of a room, with a stay across two months.
+        Case 2: Calendar of every room of the hotel, the months of the first room are read from the cache.
+        Case 3: A new reservation and the cancellation of another one refresh the cached months of the room.
+        """
+        #Case 1
+        self.assertEqual(self.get_months(id_room=self.room.id), {self.room.id: [0b11100 | 0b11 << 29, 0b1]})
+        self.assertEqual(self.get_months(id_room=self.room.id, encoding='runs'), {self.room.id: [[[3, 3], [30, 2]], [[1, 1]]]})
+        #Case 2
+        with self.assertNumQueries(3):
+            months = self.get_months(id_hotel=self.hotel.id)
+        self.assertEqual(months, {self.room.id: [0b11100 | 0b11 << 29, 0b1], self.other_room.id: [0, 0]})
+        #Case 3
+        self.model.create_model(self, **test_generate_reservation_data(id_room=self.room, id_account=self.account, id_updated_by=self.account, check_in=self.start + timedelta(days=40), check_out=self.start + timedelta(days=41)))
+        self.model.canceled_reservation(self, model_object=self.reservation)
+        self.assertEqual(self.get_months(id_hotel=self.hotel.id), {self.room.id: [0b11 << 29, 0b1 | 0b1 << 9], self.other_room.id: [0, 0]})
+
+    def test_incorrect_list_view(self):
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_room':self.room.id, 'id_hotel':self.hotel.id})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'{LOCAL_URL}{self.local_urn}', data={'id_room':self.room.id, 'months':1000})
+        self.assertEqual(response.status_code, 400)
+
+
+
+
+class ReservationQuoteViewerTestCase(APITransactionTestCase):
+    """
+    It is verified that ReservationQuoteViewer returns the price of every quote in the order of the request.
+    """
+    local_urn = '/reservation/viewer/quote/'
+
+    @classmethod
+    def setUpClass(self):
+        self.start_time = time.time()
+        super().setUpClass()
+        print(f"\nStarting the testing class: {self.__name__}")
+    
+    @classmethod
+    def tearDownClass(self):
+        super().tearDownClass()
+        print(f"\nFinishing the testing class: {self.__name__}, Elapsed time: {(time.time()-self.start_time)}" )
+    
+    def setUp(self):
+        self.model = Reservation
+        self.account = Account.objects.create_staff(**test_generate_account_data(is_active=True))
+        self.room = test_generate_new_room(id_account=self.account)
+        self.discount = Discount.objects.create(**test_generate_discount_data(discount_rate=10, discount=0, id_updated_by=self.account))
+        self.check_in = fake.date_time_this_year(before_now=False, after_now=True, tzinfo=timezone.utc)
+
+    def test_correct_list_view(self):
+        quotes = [{'id_room':self.room.id, 'check_in':self.check_in, 'check_out':self.check_in + timedelta(days=nights), 'discount_code':discount_code}
+                  for nights in (1, 4) for discount_code in (None, self.discount.discount_code)]
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':quotes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cod'], 0)
+        expected = [self.model.calculated_price(self, check_in=quote['check_in'], check_out=quote['check_out'], id_room=self.room, id_discount=self.discount if quote['discount_code'] else None) for quote in quotes]
+        self.assertEqual([Decimal(item['price']) for item in response.data['queryset']], expected)
+        self.assertEqual([item['discount_code'] for item in response.data['queryset']], [quote['discount_code'] for quote in quotes])
+
+    def test_incorrect_list_view(self):
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':[{'id_room':self.room.id, 'check_in':self.check_in, 'check_out':self.check_in}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.data)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':[{'id_room':0, 'check_in':self.check_in, 'check_out':self.check_in + timedelta(days=1)}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':[{'id_room':self.room.id, 'check_in':self.check_in, 'check_out':self.check_in + timedelta(days=1), 'id_discount':self.discount.id}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('id_discount', response.data['queryset'][0])
+        self.assertEqual(Decimal(response.data['queryset'][0]['price']), self.model.calculated_price(self, check_in=self.check_in, check_out=self.check_in + timedelta(days=1), id_room=self.room))
+        response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':[{'id_room':self.room.id, 'check_in':self.check_in, 'check_out':self.check_in + timedelta(days=1), 'discount_code':f'{self.discount.discount_code}-unknown'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(self.discount.discount_code, response.data['message'])
+        with override_settings(QUOTE_BATCH_MAX_SIZE=1):
+            response = self.client.post(f'{LOCAL_URL}{self.local_urn}', data={'quotes':[{'id_room':self.room.id, 'check_in':self.check_in, 'check_out':self.check_in + timedelta(days=1)}] * 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+
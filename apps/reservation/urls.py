@@ -1,10 +1,14 @@
 from rest_framework import routers
 
-from .views import DiscountRegisterView, ReservationRegisterView
+from .views import DiscountRegisterView, RoomRateRegisterView, ReservationRegisterView, RoomAvailabilityViewer, RoomCalendarViewer, ReservationQuoteViewer
 
 router = routers.DefaultRouter()
 router.register('register/discount', DiscountRegisterView, basename='register_discount')
+router.register('register/rate', RoomRateRegisterView, basename='register_rate')
 router.register('register/reservation', ReservationRegisterView, basename='register_reservation')
+router.register('viewer/availability', RoomAvailabilityViewer, basename='viewer_availability')
+router.register('viewer/calendar', RoomCalendarViewer, basename='viewer_calendar')
+router.register('viewer/quote', ReservationQuoteViewer, basename='viewer_quote')
 
 router.register
 
@@ -2,13 +2,18 @@ from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from rest_framework import permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from apps.reservation.models import Discount, Reservation
-from apps.reservation.serializer import DiscountRegisterSerializer, ReservationRegisterSerializer
+from hotelsolution.streaming import is_stream_requested, stream_list_response
+
+from apps.hotel.models import Room
+from apps.reservation.availability import encode_runs, get_month_days, get_room_calendars
+from apps.reservation.models import Discount, Reservation, RoomRate, OverlappingReservation
+from apps.reservation.serializer import DiscountRegisterSerializer, RoomRateRegisterSerializer, ReservationRegisterSerializer, RoomAvailabilitySearchSerializer, RoomAvailableSerializer, RoomCalendarSearchSerializer, ReservationQuoteSerializer, ReservationQuoteItemSerializer
 
 
 # Create your views here.
@@ -23,13 +28,25 @@ class BaseCRUDModelView(viewsets.ModelViewSet):
     http_method_names = None
 
     def get_queryset(self):
+        """
+        The serializer can declare a "setup_eager_loading" method to load its relations in bulk.
+        """
         if getattr(self, 'swagger_fake_view', False):
             return None
-        return self.model.objects.all()
+        queryset = self.model.objects.all()
+        serializer = self.get_serializer()
+        if hasattr(serializer, 'setup_eager_loading'):
+            queryset = serializer.setup_eager_loading(queryset)
+        return queryset
     
     def list(self, request, *args, **kwargs):
+        """
+        With "?stream=1" all the records are written incrementally instead of paginated.
+        """
         try:
             queryset = self.filter_queryset(self.get_queryset())
+            if is_stream_requested(request):
+                return stream_list_response(queryset, self.get_serializer)
 
             page = self.paginate_queryset(queryset)
             if page is not None:
@@ -52,6 +69,8 @@ class BaseCRUDModelView(viewsets.ModelViewSet):
                 model_object = model_serializer.update(model_object = model_object, validated_data = model_serializer.validated_data)
                 serializer = self.serializer_class(model_object)
                 return Response({'cod':0,'message': f'{self.model.__name__} updated successfully.', **serializer.data}, status=status.HTTP_200_OK)
+            except OverlappingReservation as e:
+                return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_409_CONFLICT)
             except ValidationError as e:
                 return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
             except Exception as e:
@@ -70,6 +89,8 @@ class BaseCRUDModelView(viewsets.ModelViewSet):
                 model_object = model_serializer.update(model_object = model_object, validated_data = model_serializer.validated_data)
                 serializer = self.serializer_class(model_object)
                 return Response({'cod':0,'message': f'{self.model.__name__} updated successfully.', **serializer.data}, status=status.HTTP_200_OK)
+            except OverlappingReservation as e:
+                return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_409_CONFLICT)
             except ValidationError as e:
                 return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
             except Exception as e:
@@ -103,6 +124,18 @@ class DiscountRegisterView(BaseCRUDModelView):
 
 
 
+class RoomRateRegisterView(BaseCRUDModelView):
+    """
+    CRUD for RoomRate Model
+    """
+    model = RoomRate
+    serializer_class = RoomRateRegisterSerializer
+    permission_classes = [permissions.IsAdminUser]
+    http_method_names = ['get','post', 'put', 'patch', 'delete']
+
+
+
+
 class ReservationRegisterView(BaseCRUDModelView):
     """
     CRUD for Reservation Model
@@ -110,4 +143,133 @@ class ReservationRegisterView(BaseCRUDModelView):
     model = Reservation
     serializer_class = ReservationRegisterSerializer
     permission_classes = [permissions.IsAdminUser]
-    http_method_names = ['get', 'post', 'put', 'patch', 'delete']
\ No newline at end of file
+    http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except OverlappingReservation as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_409_CONFLICT)
+        except ValidationError as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+
+class RoomAvailabilityViewer(viewsets.GenericViewSet):
+    """
+    Retrieve the rooms that are free between "check_in" and "check_out" for the requested number of guests, with the price
+    of the stay from the rates of every room. Optional filters: "id_hotel" and "room_status".
+    """
+    model = Reservation
+    serializer_class = RoomAvailableSerializer
+    queryset = None
+    http_method_names = ['get']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return Room.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        search_serializer = RoomAvailabilitySearchSerializer(data=request.query_params)
+        if not search_serializer.is_valid():
+            return Response({'cod':1,'message':f"{_('Data error: ')} {search_serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = list(self.model.get_query_available_rooms(self, **search_serializer.validated_data))
+            stay_prices = RoomRate.get_stay_prices(self, id_rooms=queryset, check_in=search_serializer.validated_data['check_in'], check_out=search_serializer.validated_data['check_out'])
+            serializer = self.get_serializer(queryset, many=True, context={**self.get_serializer_context(), 'stay_prices':stay_prices})
+            return Response({'cod':0, 'queryset':serializer.data}, status = status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+
+class RoomCalendarViewer(viewsets.GenericViewSet):
+    """
+    Retrieve the nights reserved of a room, "id_room", or of every room of a hotel, "id_hotel", for "months" months from
+    the one of "start", the current month by default. Every month is returned as a bitmap with the bit "day - 1" set for
+    every night reserved, or with "encoding=runs" as a list of [first_day, nights] runs of reserved nights.
+    The months of every room are cached until a reservation of the room changes.
+    """
+    model = Reservation
+    serializer_class = RoomCalendarSearchSerializer
+    queryset = None
+    http_method_names = ['get']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return Room.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        search_serializer = self.get_serializer(data=request.query_params)
+        if not search_serializer.is_valid():
+            return Response({'cod':1,'message':f"{_('Data error: ')} {search_serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
+        search = search_serializer.validated_data
+        try:
+            if 'id_room' in search:
+                id_rooms = [search['id_room'].id]
+            else:
+                id_rooms = list(Room.objects.filter(id_hotel=search['id_hotel']).order_by('id').values_list('id', flat=True))
+            calendars = get_room_calendars(id_rooms, start=search.get('start', timezone.localdate()), months=search['months'])
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = []
+        for id_room, bitmaps in calendars.items():
+            months = []
+            for (year, month), bitmap in bitmaps.items():
+                reserved = encode_runs(bitmap) if search['encoding'] == 'runs' else bitmap
+                months.append({'month':f'{year}-{month:02d}', 'days':get_month_days(year, month), 'reserved':reserved})
+            queryset.append({'id_room':id_room, 'months':months})
+        return Response({'cod':0, 'queryset':queryset}, status = status.HTTP_200_OK)
+
+
+
+
+class ReservationQuoteViewer(viewsets.GenericViewSet):
+    """
+    Price a batch of (id_room, check_in, check_out, discount_code) quotes, like the rooms and date options of a search page,
+    with the same rules as the price of a reservation.
+    """
+    model = Reservation
+    serializer_class = ReservationQuoteSerializer
+    queryset = None
+    permission_classes = [permissions.AllowAny]
+    http_method_names = ['post']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return Reservation.objects.none()
+
+    def get_discounts(self, quotes):
+        """
+        Load the discounts of the codes with a single query. An unknown code is reported without naming it or the others,
+        so the answer does not tell which codes exist.
+        """
+        codes = {quote['discount_code'] for quote in quotes if quote['discount_code'] is not None}
+        discounts = Discount.objects.only('id', 'discount_code', 'discount', 'discount_rate').in_bulk(codes, field_name='discount_code') if codes else {}
+        if len(discounts) != len(codes):
+            raise ValidationError(message=_('A discount code is not valid.'))
+        return discounts
+
+    def create(self, request, *args, **kwargs):
+        quote_serializer = self.get_serializer(data=request.data)
+        if not quote_serializer.is_valid():
+            return Response({'cod':1,'message':_('Data error.'), 'errors':quote_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        quotes = quote_serializer.validated_data['quotes']
+        try:
+            discounts = self.get_discounts(quotes)
+            prices = self.model.calculated_prices(self, quotes=[(quote['id_room'], quote['check_in'], quote['check_out'], discounts.get(quote['discount_code'])) for quote in quotes])
+        except ValidationError as e:
+            return Response({'cod':1,'message':f"{_('Unexpected validation.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'cod':1,'message':f"{_('Unexpected error.')} {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        for quote, price in zip(quotes, prices):
+            quote['price'] = price
+        return Response({'cod':0, 'queryset':ReservationQuoteItemSerializer(quotes, many=True).data}, status=status.HTTP_200_OK)
+
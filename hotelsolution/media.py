@@ -0,0 +1,129 @@
+import mimetypes, os, re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_http_methods
+
+from apps.hotel.media import is_public_media
+
+CONTENT_ADDRESSED_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def is_content_addressed(path):
+    """
+    The files named after the hash of their content never change, a new content is always stored with a new name.
+    """
+    return bool(CONTENT_ADDRESSED_PATTERN.match(os.path.splitext(os.path.basename(path))[0]))
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) inclusive positions of a single byte range, None when the header is not a single byte range,
+    which is answered with the complete file, or False when the range can not be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def get_content_type(full_path):
+    return mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+
+def iterate_file_range(file, start, length, chunk_size=64 * 1024):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def get_offload_response(path, full_path):
+    """
+    Let the front web server send the file. "sendfile" sets the X-Sendfile header with the absolute path (Apache, lighttpd),
+    "accel" sets the X-Accel-Redirect header with the path under MEDIA_ACCEL_REDIRECT_PREFIX, an internal location of nginx.
+    """
+    response = HttpResponse(content_type=get_content_type(full_path))
+    if settings.MEDIA_SENDFILE_BACKEND == 'sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{path}"
+    return response
+
+
+def get_file_response(request, full_path, size, etag):
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=get_content_type(full_path))
+
+    start, end = byte_range
+    response = StreamingHttpResponse(iterate_file_range(open(full_path, 'rb'), start, end - start + 1), status=206, content_type=get_content_type(full_path))
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """
+    Serve the files of MEDIA_ROOT with ETag and Last-Modified validators, single byte ranges and, for the content addressed
+    files, an immutable Cache-Control. With MEDIA_SENDFILE_BACKEND the transfer is handed off to the front web server.
+    The hotel and room images not processed yet, or whose processing failed, are not served.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    if not is_public_media(os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')):
+        raise Http404
+
+    stat = os.stat(full_path)
+    if is_content_addressed(path):
+        etag = quote_etag(os.path.splitext(os.path.basename(path))[0])
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    headers = {'ETag': etag, 'Last-Modified': http_date(stat.st_mtime), 'Cache-Control': cache_control, 'Accept-Ranges': 'bytes'}
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None and settings.MEDIA_SENDFILE_BACKEND:
+        response = get_offload_response(path, full_path)
+    if response is None:
+        response = get_file_response(request, full_path, stat.st_size, etag)
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -1,10 +1,12 @@
 from collections import OrderedDict
 
 from rest_framework import status
+from rest_framework.response import Response
 
 class AddCodMiddleware:
     """
     Middleware to add the 'cod' field to the responses.
+    Only REST Framework responses are modified, other responses like the 304 of the conditional requests are returned untouched.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -12,6 +14,9 @@ class AddCodMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
 
+        if not isinstance(response, Response):
+            return response
+
         #This verification will not be performed for 5XX error types.
         if not str(response.status_code).startswith('5'):
             if response.data:
@@ -0,0 +1,92 @@
+import base64, json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination ordered by ("created_at", "id"), or by "id" for the models without "created_at".
+    The cursor stores the ordering values of the last record sent, so every page is a single range query over an index
+    and the pages stay stable while new records are inserted.
+    The response keeps the {'cod':0, 'queryset':...} envelope and adds the "next" link, null on the last page.
+    """
+    ordering = ('created_at', 'id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE')
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    invalid_cursor_message = _('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if self.page_size is None:
+            return None
+
+        self.model_ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.model_ordering)
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_cursor = [getattr(results[-1], field) for field in self.model_ordering] if self.has_next else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({'cod':0, 'queryset':data, 'next':self.get_next_link()})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        field_names = [field.name for field in queryset.model._meta.get_fields()]
+        return [field for field in self.ordering if field in field_names]
+
+    def get_cursor_filter(self, cursor):
+        """
+        Lexicographic comparison with the ordering values of the cursor, like (created_at, id) > (cursor_created_at, cursor_id).
+        """
+        cursor_filter = Q()
+        for index, field in enumerate(self.model_ordering):
+            condition = Q(**{f'{field}__gt': cursor[index]})
+            for previous_field, previous_value in zip(self.model_ordering[:index], cursor[:index]):
+                condition &= Q(**{previous_field: previous_value})
+            cursor_filter |= condition
+        return cursor_filter
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(values) != len(self.model_ordering):
+                raise ValueError
+            return [queryset.model._meta.get_field(field).to_python(value) for field, value in zip(self.model_ordering, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_cursor))
@@ -0,0 +1,39 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin to choose the fields of the representation with the "?fields=" and "?exclude=" query parameters,
+    both take a comma separated list of field names. Only read requests are affected.
+    The omitted fields are removed before serializing, so their methods are not called, and the serializer can check
+    "is_field_requested" to skip the relations of the omitted fields in "setup_eager_loading" and "to_representation".
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields, self.excluded_fields = self.get_sparse_fieldset()
+        for field_name in list(self.fields):
+            if not self.is_field_requested(field_name):
+                self.fields.pop(field_name)
+
+    def get_sparse_fieldset(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None, set()
+        query_params = getattr(request, 'query_params', request.GET)
+        requested_fields = self.parse_field_names(query_params.get(self.fields_query_param))
+        excluded_fields = self.parse_field_names(query_params.get(self.exclude_query_param)) or set()
+        return requested_fields, excluded_fields
+
+    @staticmethod
+    def parse_field_names(value):
+        if not value:
+            return None
+        return {field_name.strip() for field_name in value.split(',') if field_name.strip()} or None
+
+    def is_field_requested(self, field_name):
+        if field_name in self.excluded_fields:
+            return False
+        return self.requested_fields is None or field_name in self.requested_fields
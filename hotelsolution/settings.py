@@ -90,8 +90,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'hotelsolution.pagination.KeysetPagination',
+    'PAGE_SIZE': env.int('PAGE_SIZE', default=100),
 }
 
+# Maximum page size that can be requested with the "page_size" parameter.
+PAGINATION_MAX_PAGE_SIZE = env.int('PAGINATION_MAX_PAGE_SIZE', default=1000)
+
+# Number of records serialized at once in the lists requested with "?stream=1".
+STREAMING_CHUNK_SIZE = env.int('STREAMING_CHUNK_SIZE', default=500)
+
 # SIMPLE_JWT Configuration
 # https://django-rest-framework-simplejwt.readthedocs.io/en/latest/settings.html
 
@@ -164,6 +172,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a shared backend, like "redis://127.0.0.1:6379/1", so every worker sees the same invalidations.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+VIEWER_CACHE_TIMEOUT = env.int('VIEWER_CACHE_TIMEOUT', default=60*60)
+
+#Limits of the price buckets counted by the faceted room search.
+ROOM_PRICE_FACET_BUCKETS = [int(limit) for limit in env.list('ROOM_PRICE_FACET_BUCKETS', default=[50, 100, 200, 500, 1000])]
+#Maximum number of rooms created by a single request to the bulk endpoint.
+ROOM_BULK_MAX_SIZE = env.int('ROOM_BULK_MAX_SIZE', default=1000)
+#Maximum number of (room, check_in, check_out, discount) quotes priced by a single request to the quote endpoint.
+QUOTE_BATCH_MAX_SIZE = env.int('QUOTE_BATCH_MAX_SIZE', default=5000)
+#Months returned at most by the room calendar endpoint, and the lifetime of the cached months of every room.
+ROOM_CALENDAR_MAX_MONTHS = env.int('ROOM_CALENDAR_MAX_MONTHS', default=24)
+ROOM_CALENDAR_CACHE_TIMEOUT = env.int('ROOM_CALENDAR_CACHE_TIMEOUT', default=24*60*60)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -205,6 +234,34 @@ STATIC_URL = 'static/'
 # Media files (Images)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+#The media files are stored in "shard_depth" levels of subdirectories named after "shard_width" characters of their hash.
+MEDIA_SHARD_DEPTH = env.int('MEDIA_SHARD_DEPTH', default=2)
+MEDIA_SHARD_WIDTH = env.int('MEDIA_SHARD_WIDTH', default=2)
+#Max age of the media files not named after their content, the content addressed files are cached as immutable.
+MEDIA_CACHE_MAX_AGE = env.int('MEDIA_CACHE_MAX_AGE', default=60*60)
+#Hand the media transfer off to the front web server: None, 'sendfile' (X-Sendfile) or 'accel' (nginx X-Accel-Redirect).
+MEDIA_SENDFILE_BACKEND = env('MEDIA_SENDFILE_BACKEND', default=None)
+#Internal nginx location aliased to MEDIA_ROOT, used with the 'accel' backend.
+MEDIA_ACCEL_REDIRECT_PREFIX = env('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+#Resumable media uploads: the partial files are kept outside MEDIA_ROOT until the upload is completed.
+UPLOAD_TEMP_DIR = env('UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'uploads'))
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=50*1024*1024)
+UPLOAD_CHUNK_MAX_SIZE = env.int('UPLOAD_CHUNK_MAX_SIZE', default=8*1024*1024)
+
+#Resized copies generated for every HotelMedia and RoomMedia image, the sizes are the maximum width and height in pixels.
+MEDIA_VARIANT_SIZES = {'thumbnail': 320, 'card': 800, 'full': 1920}
+MEDIA_VARIANT_FORMATS = ['jpeg', 'webp']
+MEDIA_VARIANT_QUALITY = env.int('MEDIA_VARIANT_QUALITY', default=82)
+#The uploaded images are decoded, checked, encoded again without metadata and resized in a pool of threads.
+#With 0 workers they are processed in the process that saves the image. The images not queued stay pending for "process_pending_media".
+MEDIA_PROCESSING_WORKERS = env.int('MEDIA_PROCESSING_WORKERS', default=2)
+MEDIA_PROCESSING_QUEUE_SIZE = env.int('MEDIA_PROCESSING_QUEUE_SIZE', default=100)
+MEDIA_MAX_DIMENSION = env.int('MEDIA_MAX_DIMENSION', default=12000)
+MEDIA_MAX_PIXELS = env.int('MEDIA_MAX_PIXELS', default=60_000_000)
+MEDIA_REENCODE_QUALITY = env.int('MEDIA_REENCODE_QUALITY', default=90)
+#The files not used by any record are only collected by "collect_orphan_media" once they are older than this number of seconds,
+#so the files of the uploads and the processing in progress are never removed.
+MEDIA_ORPHAN_MIN_AGE = env.int('MEDIA_ORPHAN_MIN_AGE', default=24*60*60)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -0,0 +1,45 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def iterate_queryset_chunks(queryset, chunk_size):
+    """
+    Iterate the queryset in chunks ordered by primary key, each chunk is a single range query over "pk".
+    Unlike QuerySet.iterator(), the "prefetch_related" lookups of the queryset are still applied to every chunk.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def stream_list_response(queryset, get_serializer, chunk_size=None):
+    """
+    Write the {'cod':0, 'queryset':[...]} envelope incrementally, serializing one chunk of records at a time,
+    so the memory used does not depend on the number of records returned.
+    """
+    chunk_size = settings.STREAMING_CHUNK_SIZE if chunk_size is None else chunk_size
+
+    def content():
+        yield '{"cod": 0, "queryset": ['
+        separator = ''
+        for chunk in iterate_queryset_chunks(queryset, chunk_size):
+            for item in get_serializer(chunk, many=True).data:
+                yield separator + json.dumps(item, cls=JSONEncoder, ensure_ascii=False)
+                separator = ', '
+        yield ']}'
+
+    return StreamingHttpResponse(content(), content_type='application/json')
+
+
+def is_stream_requested(request):
+    return request.query_params.get('stream', '').lower() in ('1', 'true')
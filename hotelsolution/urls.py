@@ -14,12 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 from drf_yasg import openapi, views
 
+from hotelsolution.media import serve_media
+
 #Documentation OpenAPI
 schema_view = views.get_schema_view(
    openapi.Info(
@@ -51,4 +54,7 @@ urlpatterns = [
     path('account/', include('apps.account.urls')),
     path('hotel/', include('apps.hotel.urls')),
     path('reservation/', include('apps.reservation.urls')),
+
+    #Media
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name='media'),
 ]